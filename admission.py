@@ -0,0 +1,193 @@
+"""
+Admission control for story generation requests
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+from rate_limit import TokenBucket
+
+
+class AdmissionRejected(Exception):
+    """A request was turned away; ``retry_after`` is in seconds"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionTicket:
+    """A granted generation slot; release it once the upstream work is done"""
+
+    def __init__(self, controller: "AdmissionController", tokens: int):
+        self._controller = controller
+        self._tokens = tokens
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(time.monotonic() - self._started)
+
+    def cancel(self):
+        """Release without having used the slot, returning the reserved tokens"""
+        if not self._released:
+            self._controller.token_budget.refund(self._tokens)
+            self._released = True
+            self._controller._release(0)
+
+
+class AdmissionController:
+    """Gatekeeper in front of OpenAI-backed endpoints.
+
+    Checks run cheapest first and reject fast:
+
+    1. per-client request buckets (``client_rpm`` with ``client_burst``),
+       one per IP and one per API key when the client sends one -> 429
+    2. a global tokens-per-minute budget charged with each request's
+       prompt estimate plus ``max_tokens`` -> 429
+    3. at most ``max_concurrent`` admitted requests; up to ``max_queue``
+       more wait for a slot for ``queue_timeout`` seconds -> 503
+
+    Requests that fan out (batches) pass the client check once and take
+    a slot per upstream call through ``slot()``, so they share the same
+    concurrency cap. Any limit set to 0 is disabled. Rejections carry a
+    ``Retry-After``.
+    """
+
+    # Idle client buckets are dropped once this many are tracked
+    MAX_CLIENTS = 10000
+
+    def __init__(self, max_concurrent: int = 8, max_queue: int = 32,
+                 queue_timeout: float = 30, client_rpm: float = 0,
+                 client_burst: int = 5, tokens_per_minute: float = 0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.client_rpm = client_rpm
+        self.client_burst = client_burst
+        self.token_budget = TokenBucket(tokens_per_minute)
+        self._clients: Dict[str, TokenBucket] = {}
+        self._active = 0
+        self._waiters = deque()
+        # Moving average of how long a slot is held, for Retry-After on 503
+        self._hold_seconds = 10.0
+        self.admitted = 0
+        self.rejected = {"rate_limited": 0, "token_budget": 0, "queue_full": 0, "queue_timeout": 0}
+
+    def _client_bucket(self, client: str) -> TokenBucket:
+        bucket = self._clients.get(client)
+        if bucket is None:
+            if len(self._clients) >= self.MAX_CLIENTS:
+                self._clients = {k: b for k, b in self._clients.items() if not b.is_full()}
+            bucket = self._clients[client] = TokenBucket(self.client_rpm, self.client_burst)
+        return bucket
+
+    def check_clients(self, clients: List[str]):
+        """Charge one request to each of ``clients`` or raise AdmissionRejected"""
+        if self.client_rpm <= 0:
+            return
+        buckets = [self._client_bucket(c) for c in clients]
+        for i, bucket in enumerate(buckets):
+            wait = bucket.try_acquire(1)
+            if wait:
+                for taken in buckets[:i]:
+                    taken.refund(1)
+                self.rejected["rate_limited"] += 1
+                raise AdmissionRejected(429, "Too many requests", wait)
+
+    async def admit(self, clients: List[str], tokens: int = 0) -> AdmissionTicket:
+        """Admit a request from ``clients`` (e.g. IP and API key) or raise AdmissionRejected"""
+        self.check_clients(clients)
+
+        wait = self.token_budget.try_acquire(tokens) if tokens else 0
+        if wait:
+            self.rejected["token_budget"] += 1
+            raise AdmissionRejected(429, "Token budget exhausted", wait)
+
+        try:
+            await self._acquire_slot()
+        except BaseException:
+            self.token_budget.refund(tokens)
+            raise
+        self.admitted += 1
+        return AdmissionTicket(self, tokens)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the ``max_concurrent`` slots for part of an admitted request.
+
+        Waits behind other requests for as long as it takes, without the
+        queue limit or timeout, since the request was already accepted.
+        """
+        await self._acquire_slot(limit=False)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    def _retry_estimate(self) -> float:
+        waiting = len(self._waiters) + 1
+        return self._hold_seconds * waiting / max(self.max_concurrent, 1)
+
+    async def _acquire_slot(self, limit: bool = True):
+        if self.max_concurrent <= 0:
+            return
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            return
+        if limit and len(self._waiters) >= self.max_queue:
+            self.rejected["queue_full"] += 1
+            raise AdmissionRejected(503, "Server busy, queue full", self._retry_estimate())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout if limit else None)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up
+                if isinstance(e, asyncio.TimeoutError):
+                    return
+                self._release(0)
+                raise
+            waiter.cancel()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.rejected["queue_timeout"] += 1
+            raise AdmissionRejected(503, "Server busy, timed out waiting", self._retry_estimate())
+
+    def _release(self, held: float):
+        if self.max_concurrent <= 0:
+            return
+        if held:
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot straight to the next waiter
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "tracked_clients": len(self._clients)
+        }
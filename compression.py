@@ -0,0 +1,138 @@
+"""
+Response compression for the JSON API
+"""
+import gzip
+import importlib.util
+from typing import List, Optional
+
+# Brotli needs the optional brotli package (pip install brotli)
+BROTLI_AVAILABLE = importlib.util.find_spec("brotli") is not None
+
+# Content types worth compressing; streams (SSE, NDJSON) manage their own framing
+COMPRESSIBLE_TYPES = ("application/json",)
+
+
+def accepted_encodings(accept_encoding: str) -> List[str]:
+    """Encodings from an Accept-Encoding header, skipping any with q=0"""
+    encodings = []
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            encodings.append(name.strip())
+    return encodings
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best encoding this server can produce for a client, or None"""
+    encodings = accepted_encodings(accept_encoding)
+    if BROTLI_AVAILABLE and "br" in encodings:
+        return "br"
+    if "gzip" in encodings:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        import brotli
+        # Quality 5 compresses well below gzip's size at similar speed
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+class CompressionMiddleware:
+    """Brotli or gzip for JSON responses of at least ``minimum_size`` bytes.
+
+    Only complete (non-streamed) responses are compressed. A strong ETag
+    gets the encoding appended (``"v1"`` becomes ``"v1-gzip"``), since
+    the compressed bytes are a different representation; clients echo
+    it back in If-None-Match, where ``matching_etag`` strips it again.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.minimum_size <= 0:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body = message.get("body", b"")
+            if message.get("more_body", False) or not self._compressible(start, body):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            compressed = compress(body, encoding)
+            response_headers = [(k, v) for k, v in start["headers"]
+                                if k.lower() not in (b"content-length", b"etag", b"vary")]
+            vary = b", ".join(v for k, v in start["headers"] if k.lower() == b"vary")
+            if b"accept-encoding" not in vary.lower():
+                vary = vary + b", Accept-Encoding" if vary else b"Accept-Encoding"
+            response_headers.append((b"vary", vary))
+            response_headers.append((b"content-encoding", encoding.encode()))
+            response_headers.append((b"content-length", str(len(compressed)).encode()))
+            for k, v in start["headers"]:
+                if k.lower() == b"etag":
+                    response_headers.append((b"etag", _encoded_etag(v, encoding)))
+            await send(dict(start, headers=response_headers))
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, start: dict, body: bytes) -> bool:
+        if len(body) < self.minimum_size:
+            return False
+        headers = {k.lower(): v for k, v in start["headers"]}
+        if b"content-encoding" in headers:
+            return False
+        content_type = headers.get(b"content-type", b"").decode("latin-1").split(";")[0].strip()
+        return content_type in COMPRESSIBLE_TYPES
+
+
+def _encoded_etag(etag: bytes, encoding: str) -> bytes:
+    if etag.endswith(b'"'):
+        return etag[:-1] + f'-{encoding}"'.encode()
+    return etag
+
+
+def matching_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """The If-None-Match entry that matches ``etag``, or None.
+
+    Uses the weak comparison conditional GETs call for and ignores the
+    encoding suffix added by CompressionMiddleware; a 304 should repeat
+    the returned tag so the client's cached copy keeps its own ETag.
+    """
+    if not if_none_match:
+        return None
+    target = etag.removeprefix("W/").strip('"')
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return etag
+        value = tag.removeprefix("W/").strip('"')
+        for suffix in ("-gzip", "-br"):
+            value = value.removesuffix(suffix)
+        if value == target:
+            return tag
+    return None
@@ -10,10 +10,39 @@ class Config:
     # OpenAI API Configuration
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
+    # Seconds per request (connect has its own limit) and retries with backoff
+    OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 120))
+    OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", 10))
+    OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 2))
+
+    # Connection pool shared by every OpenAI client in the process
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 20))
+    HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 10))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+    # Used only when the optional h2 package is installed
+    HTTP2 = os.getenv("HTTP2", "true").lower() in ("1", "true", "yes")
 
     # Server Configuration
     HOST = os.getenv("HOST", "127.0.0.1")
     PORT = int(os.getenv("PORT", 8036))
+    # Worker processes for the web server; more than one needs STORAGE_BACKEND=sqlite
+    WEB_WORKERS = int(os.getenv("WEB_CONCURRENCY", 1))
+    # Comma-separated list of allowed origins, or "*" for any
+    CORS_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip()]
+
+    # Admission control for /generate (0 disables a limit): concurrent
+    # generations, requests waiting for a slot and how long they wait,
+    # per-client requests per minute with a burst allowance, and a global
+    # tokens-per-minute budget charged against each request's max_tokens.
+    # Each /generate/batch item takes a slot and is charged to the budget.
+    MAX_CONCURRENT_GENERATIONS = int(os.getenv("MAX_CONCURRENT_GENERATIONS", 8))
+    GENERATION_QUEUE_SIZE = int(os.getenv("GENERATION_QUEUE_SIZE", 32))
+    GENERATION_QUEUE_TIMEOUT = float(os.getenv("GENERATION_QUEUE_TIMEOUT", 30))
+    # Off by default: behind a proxy every client shares the proxy's address
+    # unless uvicorn trusts X-Forwarded-For (FORWARDED_ALLOW_IPS)
+    CLIENT_REQUESTS_PER_MINUTE = float(os.getenv("CLIENT_REQUESTS_PER_MINUTE", 0))
+    CLIENT_BURST = int(os.getenv("CLIENT_BURST", 5))
+    GENERATE_TOKENS_PER_MINUTE = float(os.getenv("GENERATE_TOKENS_PER_MINUTE", 0))
 
     # Story Configuration
     GENRES = ["Fantasy", "Sci-Fi", "Mystery", "Romance", "Horror", "Children's", "Success", "Struggle", "Adventure", "Thriller", "Comedy", "Drama"]
@@ -25,9 +54,84 @@ class Config:
     }
     LANGUAGES = ["English", "Urdu", "Arabic", "Spanish", "French", "German"]
 
+    # Pagination for /stories, /favorites and /search
+    PAGE_SIZE = int(os.getenv("PAGE_SIZE", 20))
+    MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 100))
+
+    # Batch generation: parallel requests per batch and an OpenAI tokens-per-minute
+    # budget shared by all batches (0 disables the budget)
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+    MAX_BATCH_CONCURRENCY = int(os.getenv("MAX_BATCH_CONCURRENCY", 16))
+    MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 1000))
+    BATCH_TOKENS_PER_MINUTE = int(os.getenv("BATCH_TOKENS_PER_MINUTE", 0))
+    # Finished batch stories are written to the store in groups of this size
+    BATCH_WRITE_SIZE = int(os.getenv("BATCH_WRITE_SIZE", 50))
+
+    # Streamed generations: chunks kept for Last-Event-ID replay, and seconds a
+    # finished generation stays available to reconnecting clients
+    REPLAY_BUFFER_CHUNKS = int(os.getenv("REPLAY_BUFFER_CHUNKS", 4096))
+    GENERATION_RETENTION = float(os.getenv("GENERATION_RETENTION", 120))
+    # Seconds a generation keeps running with no client attached before it is
+    # cancelled, and whether cancelled streams save their text as incomplete
+    GENERATION_DISCONNECT_GRACE = float(os.getenv("GENERATION_DISCONNECT_GRACE", 15))
+    SAVE_PARTIAL_STORIES = os.getenv("SAVE_PARTIAL_STORIES", "false").lower() in ("1", "true", "yes")
+
+    # JSON responses of at least this many bytes are sent with brotli (if the
+    # brotli package is installed) or gzip when the client accepts it; 0 disables
+    COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+
+    # Streamed token deltas are merged into one SSE frame at most every
+    # STREAM_FRAME_INTERVAL seconds (0 sends every delta as its own frame) or
+    # once STREAM_FRAME_CHARS are waiting; the first delta always goes out at once.
+    # STREAM_GZIP compresses the stream for clients that accept gzip.
+    STREAM_FRAME_INTERVAL = float(os.getenv("STREAM_FRAME_INTERVAL", 0.04))
+    STREAM_FRAME_CHARS = int(os.getenv("STREAM_FRAME_CHARS", 2048))
+    # Redraws per second while the Streamlit app shows a story streaming in
+    # (0 redraws on every chunk)
+    STREAMLIT_RENDER_FPS = float(os.getenv("STREAMLIT_RENDER_FPS", 8))
+    # Let the Streamlit library tab list every visitor's stories, not just the
+    # session's own; keep it off for a public app
+    STREAMLIT_SHOW_ALL_STORIES = os.getenv("STREAMLIT_SHOW_ALL_STORIES", "false").lower() in ("1", "true", "yes")
+    STREAM_GZIP = os.getenv("STREAM_GZIP", "false").lower() in ("1", "true", "yes")
+
+    # Let identical concurrent /generate requests share one upstream completion.
+    # Off unless enabled here or per request with coalesce=true.
+    COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "false").lower() in ("1", "true", "yes")
+
     # Storage Configuration
+    # Backend for the story library: "memory", "json" (snapshot + append log) or
+    # "sqlite". SQLite is the default because the web server, its workers, the
+    # CLI and Streamlit can all share it; an existing stories.json is imported
+    # the first time stories.db is created.
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
     STORIES_DIR = os.getenv("STORIES_DIR", "stories")
     STORIES_FILE = os.path.join(STORIES_DIR, "stories.json")
+    STORIES_LOG_FILE = os.path.join(STORIES_DIR, "stories.log")
+    # Compact the mutation log into a new snapshot once it grows past this size
+    LOG_COMPACT_BYTES = int(os.getenv("LOG_COMPACT_BYTES", 1024 * 1024))
+    SQLITE_FILE = os.path.join(STORIES_DIR, "stories.db")
+    # Several web workers (uvicorn --workers N) need STORAGE_BACKEND=sqlite: the
+    # json store is locked to one process. Seconds a writer waits for the
+    # database lock, and how many recent changes are kept for other workers.
+    SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", 30))
+    CHANGE_FEED_SIZE = int(os.getenv("CHANGE_FEED_SIZE", 10000))
+    # When writes reach the disk: "sync" (before the request returns), "batched"
+    # (group commit every STORAGE_FLUSH_INTERVAL seconds or STORAGE_FLUSH_RECORDS
+    # records; a crash can lose the last interval) or, for the json store only,
+    # "memory" (never written, as on free cloud tiers without a persistent disk)
+    STORAGE_DURABILITY = os.getenv("STORAGE_DURABILITY", "sync")
+    STORAGE_FLUSH_INTERVAL = float(os.getenv("STORAGE_FLUSH_INTERVAL", 0.2))
+    STORAGE_FLUSH_RECORDS = int(os.getenv("STORAGE_FLUSH_RECORDS", 256))
+    # Seconds between saves of the running stats (always saved on shutdown)
+    STATS_SAVE_INTERVAL = float(os.getenv("STATS_SAVE_INTERVAL", 5))
+
+    # Response cache: repeat requests with the same prompt and settings reuse the
+    # earlier story text. Off unless enabled here or per request with cache=true.
+    RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "false").lower() in ("1", "true", "yes")
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 256))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 24 * 3600))
+    RESPONSE_CACHE_DIR = os.path.join(STORIES_DIR, "cache")
+    RESPONSE_CACHE_DISK_ENTRIES = int(os.getenv("RESPONSE_CACHE_DISK_ENTRIES", 5000))
 
     @classmethod
     def validate(cls):
@@ -0,0 +1,259 @@
+"""
+In-flight story generations for resumable streaming
+"""
+import asyncio
+import time
+import uuid
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+class Generation:
+    """One streamed story generation, decoupled from the client reading it.
+
+    Chunks are numbered from 1 and kept in a bounded replay buffer, so a
+    reader that reconnects with the id of the last chunk it saw picks up
+    where it left off. Once the story is saved a final ``done`` event
+    carries it; a failed generation ends with an ``error`` event and a
+    cancelled one with ``cancelled`` (carrying the partial story if saved).
+    """
+
+    def __init__(self, generation_id: str, max_chunks: int):
+        self.id = generation_id
+        self.max_chunks = max_chunks
+        self.last_seq = 0
+        self.story: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.cancelled = False
+        self.done = False
+        # Number of clients currently reading the stream
+        self.readers = 0
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._chunks: List[str] = []
+        self._first_seq = 1
+        self._changed = asyncio.Event()
+        # Characters streamed so far, and readers merging chunks (see events)
+        self.chars = 0
+        self._gatherers: List[Tuple[Optional[int], asyncio.Future]] = []
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def append(self, text: str):
+        self._chunks.append(text)
+        self.last_seq += 1
+        self.chars += len(text)
+        for target, waiter in self._gatherers:
+            if target is not None and self.chars >= target:
+                self._wake(waiter)
+        if len(self._chunks) > self.max_chunks:
+            # Drop the oldest half at once so trimming stays amortized O(1)
+            drop = len(self._chunks) - self.max_chunks // 2
+            del self._chunks[:drop]
+            self._first_seq += drop
+        self._notify()
+
+    def finish(self, story: Optional[dict] = None, error: Optional[str] = None,
+               cancelled: bool = False):
+        self.story = story
+        self.error = error
+        self.cancelled = cancelled
+        self.done = True
+        self.finished_at = time.monotonic()
+        for _, waiter in self._gatherers:
+            self._wake(waiter)
+        self._notify()
+
+    async def events(self, after: int = 0, interval: float = 0,
+                     max_chars: int = 0) -> AsyncIterator[Tuple[int, str, object]]:
+        """Yield ``(event_id, kind, payload)`` for everything after event id ``after``.
+
+        ``kind`` is ``"chunk"`` (payload: text), ``"done"`` (payload: the
+        saved story), ``"cancelled"`` (payload: the partial story or None)
+        or ``"error"`` (payload: message).
+
+        With ``interval`` > 0 consecutive chunks are merged into one event
+        (carrying the id of its last chunk) at most every ``interval``
+        seconds, or as soon as ``max_chars`` of text are waiting. The first
+        chunk after a quiet period is sent straight away, so time to first
+        token is unchanged.
+        """
+        while True:
+            if after + 1 < self._first_seq and after < self.last_seq:
+                yield self.last_seq + 1, "error", "Replay buffer no longer holds this position"
+                return
+            first_seq = self._first_seq
+            pending = self._chunks[max(after + 1 - first_seq, 0):]
+            start = max(after + 1, first_seq)
+            if interval > 0 and pending:
+                for seq, text in self._merge(pending, start, max_chars):
+                    after = seq
+                    yield seq, "chunk", text
+                if not self.done:
+                    await self._gather(after, interval, max_chars)
+                continue
+            for seq, text in enumerate(pending, start):
+                after = seq
+                yield seq, "chunk", text
+            if self.done and after >= self.last_seq:
+                if self.cancelled:
+                    yield self.last_seq + 1, "cancelled", self.story
+                elif self.error is not None:
+                    yield self.last_seq + 1, "error", self.error
+                else:
+                    yield self.last_seq + 1, "done", self.story
+                return
+            if after >= self.last_seq:
+                await self._changed.wait()
+
+    @staticmethod
+    def _merge(chunks: List[str], first_seq: int, max_chars: int) -> Iterator[Tuple[int, str]]:
+        """Join chunks into ``(last seq, text)`` groups of about ``max_chars`` (0: one group)"""
+        group: List[str] = []
+        size = 0
+        for seq, text in enumerate(chunks, first_seq):
+            group.append(text)
+            size += len(text)
+            if max_chars and size >= max_chars:
+                yield seq, "".join(group)
+                group, size = [], 0
+        if group:
+            yield first_seq + len(chunks) - 1, "".join(group)
+
+    async def _gather(self, after: int, interval: float, max_chars: int):
+        """Let chunks after ``after`` pile up for ``interval`` seconds or ``max_chars``"""
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        timer = loop.call_later(interval, self._wake, waiter)
+        # Woken by append once the text waiting for this reader reaches max_chars
+        target = self._chars_upto(after) + max_chars if max_chars else None
+        gatherer = (target, waiter)
+        self._gatherers.append(gatherer)
+        try:
+            await waiter
+        finally:
+            timer.cancel()
+            self._gatherers.remove(gatherer)
+
+    def _chars_upto(self, seq: int) -> int:
+        """Total characters streamed up to and including chunk ``seq``"""
+        waiting = self._chunks[max(seq + 1 - self._first_seq, 0):]
+        return self.chars - sum(map(len, waiting))
+
+    @staticmethod
+    def _wake(waiter: asyncio.Future):
+        if not waiter.done():
+            waiter.set_result(None)
+
+
+class GenerationRegistry:
+    """Running and recently finished generations, by id.
+
+    Finished generations are kept for ``retention`` seconds so a client
+    that reconnects right after the end still receives the final event.
+
+    Generations started with a ``key`` are single-flight: while one is
+    running, starting another with the same key returns the running one,
+    so identical requests share a single upstream stream. Late joiners
+    read from the first event and so get the buffered prefix first.
+    """
+
+    def __init__(self, max_chunks: int = 4096, retention: float = 120,
+                 disconnect_grace: float = 15):
+        self.max_chunks = max_chunks
+        self.retention = retention
+        self.disconnect_grace = disconnect_grace
+        self._generations: Dict[str, Generation] = {}
+        self._inflight: Dict[str, Generation] = {}
+        self.coalesced = 0
+
+    def start(self, make_stream: Callable[[Callable[[dict], None]], AsyncIterator[str]],
+              key: Optional[str] = None) -> Tuple[Generation, bool]:
+        """Run a story stream in the background; return ``(generation, joined)``.
+
+        ``make_stream(on_complete)`` must return the async iterator of
+        chunks and call ``on_complete(story)`` once the story is saved.
+        ``joined`` is True when an in-flight generation with the same
+        ``key`` was reused instead and ``make_stream`` was not called.
+        """
+        if key is not None:
+            running = self._inflight.get(key)
+            if running is not None and not running.done:
+                self.coalesced += 1
+                return running, True
+        self._expire()
+        generation = Generation(uuid.uuid4().hex, self.max_chunks)
+        self._generations[generation.id] = generation
+        if key is not None:
+            self._inflight[key] = generation
+        generation.task = asyncio.create_task(self._run(generation, make_stream, key))
+        return generation, False
+
+    async def _run(self, generation: Generation, make_stream, key: Optional[str]):
+        story = {}
+        try:
+            async for chunk in make_stream(story.update):
+                generation.append(chunk)
+        except asyncio.CancelledError:
+            generation.finish(story=story or None, error="Generation cancelled", cancelled=True)
+            raise
+        except Exception as e:
+            generation.finish(error=str(e))
+        else:
+            generation.finish(story=story or None)
+        finally:
+            if key is not None and self._inflight.get(key) is generation:
+                del self._inflight[key]
+
+    def get(self, generation_id: str) -> Optional[Generation]:
+        return self._generations.get(generation_id)
+
+    def cancel(self, generation: Generation) -> bool:
+        """Stop a running generation; False if it had already finished"""
+        if generation.done or generation.task is None:
+            return False
+        return generation.task.cancel()
+
+    def attach(self, generation: Generation):
+        generation.readers += 1
+
+    def detach(self, generation: Generation):
+        """A reader went away; cancel the generation if nobody reattaches in time"""
+        generation.readers -= 1
+        if generation.readers > 0 or generation.done:
+            return
+        if self.disconnect_grace <= 0:
+            self.cancel(generation)
+        else:
+            asyncio.get_running_loop().call_later(
+                self.disconnect_grace, self._cancel_if_abandoned, generation
+            )
+
+    def _cancel_if_abandoned(self, generation: Generation):
+        if generation.readers == 0:
+            self.cancel(generation)
+
+    async def aclose(self):
+        """Cancel every running generation and wait for them to wind down"""
+        tasks = [g.task for g in self._generations.values() if g.task and not g.done]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.retention
+        expired = [gid for gid, g in self._generations.items()
+                   if g.done and g.finished_at < cutoff]
+        for gid in expired:
+            del self._generations[gid]
+
+    def stats(self) -> dict:
+        return {
+            "running": sum(1 for g in self._generations.values() if not g.done),
+            "retained": len(self._generations),
+            "coalesced": self.coalesced
+        }
+
+    def __len__(self):
+        return len(self._generations)
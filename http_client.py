@@ -0,0 +1,264 @@
+"""
+Shared OpenAI clients for StoryWriterAgent
+"""
+import importlib.util
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from config import Config
+
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class PoolStats:
+    """Request counters for one connection pool.
+
+    A request counts as in flight from send until its response body is
+    closed, so long streamed completions show up as busy connections.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.busy_seconds = 0.0
+
+    def started(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finished(self, started_at: float, error: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            self.busy_seconds += time.perf_counter() - started_at
+            if error:
+                self.errors += 1
+
+
+def _connection_counts(transport) -> tuple:
+    """``(open, idle)`` connections in an httpx transport's pool, if exposed"""
+    pool = getattr(transport, "_pool", None)
+    connections = list(getattr(pool, "connections", None) or [])
+    idle = sum(1 for c in connections if getattr(c, "is_idle", lambda: False)())
+    return len(connections), idle
+
+
+class _TrackedStream(httpx.SyncByteStream):
+    def __init__(self, stream, stats: PoolStats, started_at: float):
+        self._stream = stream
+        self._stats = stats
+        self._started_at = started_at
+        self._closed = False
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._stats.finished(self._started_at)
+
+
+class _AsyncTrackedStream(httpx.AsyncByteStream):
+    def __init__(self, stream, stats: PoolStats, started_at: float):
+        self._stream = stream
+        self._stats = stats
+        self._started_at = started_at
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._stats.finished(self._started_at)
+
+
+class CountingTransport(httpx.HTTPTransport):
+    """HTTP transport that records pool utilization"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.started()
+        started_at = time.perf_counter()
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            self.stats.finished(started_at, error=True)
+            raise
+        response.stream = _TrackedStream(response.stream, self.stats, started_at)
+        return response
+
+
+class AsyncCountingTransport(httpx.AsyncHTTPTransport):
+    """Async HTTP transport that records pool utilization"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.started()
+        started_at = time.perf_counter()
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self.stats.finished(started_at, error=True)
+            raise
+        response.stream = _AsyncTrackedStream(response.stream, self.stats, started_at)
+        return response
+
+
+def _pool_options() -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=Config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY
+        ),
+        "http2": Config.HTTP2 and HTTP2_AVAILABLE,
+        "retries": 0  # retries with backoff are done by the OpenAI client
+    }
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(Config.OPENAI_TIMEOUT, connect=Config.OPENAI_CONNECT_TIMEOUT)
+
+
+_lock = threading.Lock()
+_http: Optional[httpx.Client] = None
+_async_http: Optional[httpx.AsyncClient] = None
+_transport: Optional[CountingTransport] = None
+_async_transport: Optional[AsyncCountingTransport] = None
+# Clients by API key, least recently used first. Keys typed into the
+# Streamlit sidebar land here too, so only the most recent are kept; a
+# dropped client is not closed, since its connection pool is shared.
+MAX_CACHED_CLIENTS = 32
+_clients: "OrderedDict[str, OpenAI]" = OrderedDict()
+_async_clients: "OrderedDict[str, AsyncOpenAI]" = OrderedDict()
+
+
+def _cached(clients: OrderedDict, api_key: str, create: Callable[[], object]):
+    """The client for ``api_key`` from ``clients``, created on a miss (lock held)"""
+    client = clients.get(api_key)
+    if client is None:
+        client = clients[api_key] = create()
+        if len(clients) > MAX_CACHED_CLIENTS:
+            clients.popitem(last=False)
+    else:
+        clients.move_to_end(api_key)
+    return client
+
+
+def _http_client() -> httpx.Client:
+    global _http, _transport
+    if _http is None:
+        _transport = CountingTransport(**_pool_options())
+        _http = httpx.Client(transport=_transport, timeout=_timeout())
+    return _http
+
+
+def _async_http_client() -> httpx.AsyncClient:
+    global _async_http, _async_transport
+    if _async_http is None:
+        _async_transport = AsyncCountingTransport(**_pool_options())
+        _async_http = httpx.AsyncClient(transport=_async_transport, timeout=_timeout())
+    return _async_http
+
+
+def get_client(api_key: Optional[str] = None) -> OpenAI:
+    """Process-wide OpenAI client; every API key shares one connection pool"""
+    api_key = api_key or Config.OPENAI_API_KEY
+    with _lock:
+        return _cached(_clients, api_key, lambda: OpenAI(
+            api_key=api_key,
+            http_client=_http_client(),
+            max_retries=Config.OPENAI_MAX_RETRIES,
+            timeout=_timeout()
+        ))
+
+
+def get_async_client(api_key: Optional[str] = None) -> AsyncOpenAI:
+    """Process-wide AsyncOpenAI client for use on the server's event loop"""
+    api_key = api_key or Config.OPENAI_API_KEY
+    with _lock:
+        return _cached(_async_clients, api_key, lambda: AsyncOpenAI(
+            api_key=api_key,
+            http_client=_async_http_client(),
+            max_retries=Config.OPENAI_MAX_RETRIES,
+            timeout=_timeout()
+        ))
+
+
+def new_async_client(api_key: Optional[str] = None) -> AsyncOpenAI:
+    """AsyncOpenAI with a connection pool of its own, for an event loop other
+    than the server's; close it on that loop (``await client.close()``)"""
+    return AsyncOpenAI(
+        api_key=api_key or Config.OPENAI_API_KEY,
+        http_client=httpx.AsyncClient(transport=AsyncCountingTransport(**_pool_options()),
+                                      timeout=_timeout()),
+        max_retries=Config.OPENAI_MAX_RETRIES,
+        timeout=_timeout()
+    )
+
+
+def _pool_summary(transport) -> Optional[dict]:
+    if transport is None:
+        return None
+    stats = transport.stats
+    connections, idle = _connection_counts(transport)
+    return {
+        "requests": stats.requests,
+        "errors": stats.errors,
+        "in_flight": stats.in_flight,
+        "peak_in_flight": stats.peak_in_flight,
+        "avg_request_seconds": round(stats.busy_seconds / stats.requests, 4) if stats.requests else 0.0,
+        "connections": connections,
+        "idle_connections": idle,
+        "utilization": round(stats.in_flight / Config.HTTP_MAX_CONNECTIONS, 4)
+    }
+
+
+def pool_stats() -> dict:
+    """Utilization of the shared sync and async connection pools"""
+    return {
+        "max_connections": Config.HTTP_MAX_CONNECTIONS,
+        "http2": Config.HTTP2 and HTTP2_AVAILABLE,
+        "sync": _pool_summary(_transport),
+        "async": _pool_summary(_async_transport)
+    }
+
+
+async def aclose_clients():
+    """Close the shared pools (on server shutdown)"""
+    global _http, _async_http, _transport, _async_transport
+    with _lock:
+        http, async_http = _http, _async_http
+        _http = _async_http = _transport = _async_transport = None
+        _clients.clear()
+        _async_clients.clear()
+    if http is not None:
+        http.close()
+    if async_http is not None:
+        await async_http.aclose()
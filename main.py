@@ -4,13 +4,30 @@ Day 36 of #100DaysOfAI-Agents
 Author: Muhammad Sami
 """
 import argparse
+import atexit
+import json
+import os
 import sys
+from typing import TYPE_CHECKING
 from colorama import init, Fore, Style
 
 init()  # Initialize colorama for Windows
 
 from config import Config, EXAMPLE_PROMPTS
-from story_agent import StoryAgent
+from story_buffer import StoryBuffer
+
+if TYPE_CHECKING:
+    # story_agent pulls in the OpenAI SDK; commands import it when they need it
+    from story_agent import StoryAgent
+
+
+def create_agent(require_api_key: bool = True) -> "StoryAgent":
+    """Import and build the agent on demand, keeping CLI startup fast"""
+    from story_agent import StoryAgent
+    agent = StoryAgent(require_api_key=require_api_key)
+    # Safety net so batched writes are flushed however the CLI exits
+    atexit.register(agent.close)
+    return agent
 
 
 def print_banner():
@@ -47,7 +64,26 @@ def print_help():
     print(help_text)
 
 
-def interactive_generate(agent: StoryAgent):
+def print_stream(stream):
+    """Print a story stream as it arrives; Ctrl+C stops the generation"""
+    buffer = StoryBuffer()
+    try:
+        for chunk in stream:
+            buffer.append(chunk)
+            print(chunk, end="", flush=True)
+    except KeyboardInterrupt:
+        # Close the upstream stream now instead of when the generator is collected
+        stream.close()
+        print(f"\n\n{Fore.CYAN}{'─' * 60}{Style.RESET_ALL}")
+        saved = " (partial story saved)" if Config.SAVE_PARTIAL_STORIES and buffer.word_count else ""
+        print(f"\n{Fore.YELLOW}Generation cancelled after {buffer.word_count} words{saved}.{Style.RESET_ALL}\n")
+        return
+
+    print(f"\n\n{Fore.CYAN}{'─' * 60}{Style.RESET_ALL}")
+    print(f"\n{Fore.GREEN}Story saved successfully! ({buffer.word_count} words){Style.RESET_ALL}\n")
+
+
+def interactive_generate(agent: "StoryAgent"):
     """Interactive story generation"""
     print(f"\n{Fore.YELLOW}=== Story Generation ==={Style.RESET_ALL}\n")
 
@@ -90,14 +126,10 @@ def interactive_generate(agent: StoryAgent):
     print(f"{Fore.CYAN}{'─' * 60}{Style.RESET_ALL}\n")
 
     # Generate with streaming
-    for chunk in agent.generate_story_stream(prompt, genre, tone, length, language):
-        print(chunk, end="", flush=True)
-
-    print(f"\n\n{Fore.CYAN}{'─' * 60}{Style.RESET_ALL}")
-    print(f"\n{Fore.GREEN}Story saved successfully!{Style.RESET_ALL}\n")
+    print_stream(agent.generate_story_stream(prompt, genre, tone, length, language))
 
 
-def list_stories(agent: StoryAgent):
+def list_stories(agent: "StoryAgent"):
     """List all stories"""
     stories = agent.get_all_stories()
     if not stories:
@@ -112,7 +144,7 @@ def list_stories(agent: StoryAgent):
         print()
 
 
-def search_stories(agent: StoryAgent, query: str):
+def search_stories(agent: "StoryAgent", query: str):
     """Search stories"""
     results = agent.search_stories(query)
     if not results:
@@ -126,7 +158,7 @@ def search_stories(agent: StoryAgent, query: str):
     print()
 
 
-def show_favorites(agent: StoryAgent):
+def show_favorites(agent: "StoryAgent"):
     """Show favorite stories"""
     favorites = agent.get_favorites()
     if not favorites:
@@ -139,7 +171,7 @@ def show_favorites(agent: StoryAgent):
     print()
 
 
-def show_stats(agent: StoryAgent):
+def show_stats(agent: "StoryAgent"):
     """Show writing statistics"""
     stats = agent.get_stats()
     print(f"\n{Fore.YELLOW}=== Writing Statistics ==={Style.RESET_ALL}\n")
@@ -178,16 +210,46 @@ def show_config():
     print()
 
 
-def quick_generate(agent: StoryAgent, prompt: str, genre: str, tone: str, length: str, language: str):
+def quick_generate(agent: "StoryAgent", prompt: str, genre: str, tone: str, length: str, language: str,
+                   cache: bool = None):
     """Quick story generation"""
     print(f"\n{Fore.YELLOW}Generating story...{Style.RESET_ALL}\n")
     print(f"{Fore.CYAN}{'─' * 60}{Style.RESET_ALL}\n")
 
-    for chunk in agent.generate_story_stream(prompt, genre, tone, length, language):
-        print(chunk, end="", flush=True)
-
-    print(f"\n\n{Fore.CYAN}{'─' * 60}{Style.RESET_ALL}")
-    print(f"\n{Fore.GREEN}Story saved successfully!{Style.RESET_ALL}\n")
+    print_stream(agent.generate_story_stream(prompt, genre, tone, length, language, cache=cache))
+
+
+def batch_generate(agent: "StoryAgent", path: str, genre: str, tone: str, length: str,
+                   language: str, concurrency: int = None, tokens_per_minute: int = None,
+                   cache: bool = None):
+    """Generate a story for every line of a JSONL prompt file.
+
+    Each line is a JSON object with a ``prompt`` and optional genre, tone,
+    length and language (a bare JSON string is taken as the prompt). Results
+    are printed to stdout as NDJSON in completion order.
+    """
+    defaults = {"genre": genre, "tone": tone, "length": length, "language": language}
+
+    def items():
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                yield dict(defaults, prompt=item) if isinstance(item, str) else dict(defaults, **item)
+
+    from rate_limit import TokenBucket
+    budget = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+    done = failed = 0
+    for result in agent.generate_batch(items(), concurrency=concurrency,
+                                       token_budget=budget, cache=cache):
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+        if "error" in result:
+            failed += 1
+        else:
+            done += 1
+    color = Fore.GREEN if not failed else Fore.YELLOW
+    print(f"{color}Batch finished: {done} saved, {failed} failed{Style.RESET_ALL}", file=sys.stderr)
 
 
 def terminal_mode():
@@ -196,12 +258,21 @@ def terminal_mode():
     print_help()
 
     try:
-        agent = StoryAgent()
+        Config.validate()
         print(f"{Fore.GREEN}Agent initialized successfully!{Style.RESET_ALL}\n")
     except Exception as e:
         print(f"{Fore.RED}Error initializing agent: {e}{Style.RESET_ALL}")
         sys.exit(1)
 
+    # Built on the first command that needs it, so help/examples/config stay instant
+    agent = None
+
+    def get_agent():
+        nonlocal agent
+        if agent is None:
+            agent = create_agent()
+        return agent
+
     while True:
         try:
             command = input(f"{Fore.CYAN}StoryWriter> {Style.RESET_ALL}").strip().lower()
@@ -214,16 +285,16 @@ def terminal_mode():
             elif command == 'help':
                 print_help()
             elif command.startswith('generate'):
-                interactive_generate(agent)
+                interactive_generate(get_agent())
             elif command == 'list':
-                list_stories(agent)
+                list_stories(get_agent())
             elif command.startswith('search '):
                 query = command[7:].strip()
-                search_stories(agent, query)
+                search_stories(get_agent(), query)
             elif command == 'favorites':
-                show_favorites(agent)
+                show_favorites(get_agent())
             elif command == 'stats':
-                show_stats(agent)
+                show_stats(get_agent())
             elif command == 'examples':
                 show_examples()
             elif command == 'config':
@@ -236,6 +307,35 @@ def terminal_mode():
         except Exception as e:
             print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}")
 
+    if agent is not None:
+        agent.close()
+
+
+def export_library(agent: "StoryAgent", path: str, format: str = None,
+                   favorites_only: bool = False, genre: str = None, query: str = None):
+    """Stream the library (or the matching stories) to a file"""
+    if format is None:
+        extension = os.path.splitext(path)[1].lower().lstrip('.')
+        format = {'jsonl': 'ndjson', 'markdown': 'md'}.get(extension, extension)
+    from story_export import LIBRARY_FORMATS
+    if format not in LIBRARY_FORMATS:
+        print(f"{Fore.RED}Unknown export format '{format}'. Use --format zip, ndjson or md.{Style.RESET_ALL}")
+        return
+    written = 0
+    # Write to a temporary name so an interrupted export never looks complete
+    tmp_path = f"{path}.part"
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in agent.export_library(format, favorites_only, genre, query):
+                f.write(chunk)
+                written += len(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    print(f"{Fore.GREEN}Exported library to {path} ({written / 1024:.1f} KB){Style.RESET_ALL}")
+
 
 def main():
     """Main entry point"""
@@ -245,6 +345,19 @@ def main():
     parser.add_argument('--web', action='store_true', help='Start web interface')
     parser.add_argument('--terminal', action='store_true', help='Start terminal interface')
     parser.add_argument('--quick', type=str, help='Quick story generation with prompt')
+    parser.add_argument('--batch', type=str, metavar='PROMPTS.jsonl',
+                        help='Generate a story for every prompt in a JSONL file')
+    parser.add_argument('--concurrency', type=int, help='Parallel requests in batch mode')
+    parser.add_argument('--tpm', type=int, help='Tokens-per-minute budget in batch mode')
+    parser.add_argument('--cache', action=argparse.BooleanOptionalAction, default=None,
+                        help='Reuse cached text for repeat prompts (default: RESPONSE_CACHE)')
+    parser.add_argument('--export', type=str, metavar='FILE',
+                        help='Export the library to FILE (.zip, .ndjson or .md)')
+    parser.add_argument('--format', type=str, choices=['zip', 'ndjson', 'md'],
+                        help='Export format (default: from the file extension)')
+    parser.add_argument('--favorites', action='store_true', help='Export only favorite stories')
+    parser.add_argument('--search', type=str, metavar='QUERY', help='Export only stories matching QUERY')
+    parser.add_argument('--only-genre', type=str, metavar='GENRE', help='Export only stories of GENRE')
     parser.add_argument('--genre', type=str, default='Fantasy', help='Story genre')
     parser.add_argument('--tone', type=str, default='Serious', help='Story tone')
     parser.add_argument('--length', type=str, default='medium', help='Story length (short/medium/long)')
@@ -255,10 +368,29 @@ def main():
     if args.web:
         from web_app import run_server
         run_server()
+    elif args.export:
+        # Exporting only reads the library; no OpenAI key needed
+        agent = create_agent(require_api_key=False)
+        try:
+            export_library(agent, args.export, args.format, args.favorites,
+                           args.only_genre, args.search)
+        finally:
+            agent.close()
+    elif args.batch:
+        agent = create_agent()
+        try:
+            batch_generate(agent, args.batch, args.genre, args.tone, args.length,
+                           args.language, args.concurrency, args.tpm, args.cache)
+        finally:
+            agent.close()
     elif args.quick:
         print_banner()
-        agent = StoryAgent()
-        quick_generate(agent, args.quick, args.genre, args.tone, args.length, args.language)
+        agent = create_agent()
+        try:
+            quick_generate(agent, args.quick, args.genre, args.tone, args.length, args.language,
+                           args.cache)
+        finally:
+            agent.close()
     else:
         terminal_mode()
 
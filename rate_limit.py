@@ -0,0 +1,72 @@
+"""
+Token-rate budgeting for StoryWriterAgent
+"""
+import asyncio
+import time
+
+
+def estimate_tokens(params: dict) -> int:
+    """Rough upper bound on the tokens a chat completion will use.
+
+    Prompt text is counted at ~4 characters per token; the completion is
+    assumed to use its whole ``max_tokens``. The bucket is credited back
+    with the difference once the real usage is known.
+    """
+    prompt_chars = sum(len(m.get("content", "")) for m in params.get("messages", []))
+    return prompt_chars // 4 + params.get("max_tokens", 0)
+
+
+class TokenBucket:
+    """Tokens-per-minute budget shared by concurrent requests.
+
+    ``acquire`` reserves tokens immediately and sleeps until the bucket has
+    refilled enough to cover them, so callers are served in arrival order
+    without a lock. A rate of 0 or less disables the budget.
+    """
+
+    def __init__(self, tokens_per_minute: float, capacity: float = None):
+        self.rate = tokens_per_minute / 60
+        self.capacity = capacity or tokens_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: int):
+        """Wait until ``tokens`` fit in the budget"""
+        if self.rate <= 0:
+            return
+        self._refill()
+        # A single request larger than the bucket would otherwise never fit
+        self.tokens -= min(tokens, self.capacity)
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+    def try_acquire(self, tokens: int) -> float:
+        """Take ``tokens`` if they are available now.
+
+        Returns 0 on success, otherwise the seconds until they would be
+        (nothing is taken in that case).
+        """
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        tokens = min(tokens, self.capacity)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    def refund(self, tokens: int):
+        """Return tokens that were reserved but not used"""
+        if self.rate <= 0 or tokens <= 0:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + tokens)
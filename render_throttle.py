@@ -0,0 +1,70 @@
+"""
+Frame-rate limited rendering of streamed stories in Streamlit
+"""
+import time
+from typing import Callable, Optional
+
+from story_buffer import StoryBuffer
+
+
+class ThrottledRenderer:
+    """Shows a growing story without re-sending it on every chunk.
+
+    ``update`` redraws at most ``fps`` times a second. Paragraphs that are
+    complete (followed by a blank line) are drawn once into their own
+    element and never touched again; each frame only re-sends the
+    paragraph still being written, so the cost per frame stays flat as the
+    story grows. ``finish`` replaces the pieces with one full render.
+
+    ``area`` is an ``st.empty()`` placeholder and ``draw(element, text,
+    final)`` writes ``text`` into a Streamlit element.
+    """
+
+    def __init__(self, area, draw: Callable[[object, str, bool], None], fps: float = 8):
+        self.area = area
+        self.draw = draw
+        self.interval = 1 / fps if fps > 0 else 0
+        self.frames = 0
+        self._parts = area.container()
+        self._live = None
+        # Length of the text already drawn into finished paragraphs
+        self._frozen = 0
+        self._drawn = 0
+        self._next_frame = 0.0
+
+    def update(self, buffer: StoryBuffer, force: bool = False):
+        """Redraw if a frame is due (or ``force``) and there is new text"""
+        if len(buffer) == self._drawn:
+            return
+        now = time.monotonic()
+        if not force and now < self._next_frame:
+            return
+        self._next_frame = now + self.interval
+        text = buffer.text()
+        self._drawn = len(text)
+
+        tail = text[self._frozen:]
+        end = tail.rfind("\n\n")
+        if end >= 0:
+            finished = tail[:end].strip("\n")
+            if finished:
+                # The live element becomes this paragraph's permanent home
+                self.draw(self._element(), finished, False)
+                self._live = None
+            self._frozen += end + 2
+            tail = tail[end + 2:]
+        if tail.strip():
+            self.draw(self._element(), tail, False)
+        self.frames += 1
+
+    def _element(self):
+        if self._live is None:
+            self._live = self._parts.empty()
+        return self._live
+
+    def finish(self, text: Optional[str] = None, buffer: Optional[StoryBuffer] = None):
+        """Replace the streamed pieces with a single render of the whole story"""
+        if text is None:
+            text = buffer.text() if buffer is not None else ""
+        self.draw(self.area, text, True)
+        self.frames += 1
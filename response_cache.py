@@ -0,0 +1,147 @@
+"""
+Response cache for StoryWriterAgent
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from story_store import write_json_atomic
+
+
+class ResponseCache:
+    """LRU cache of generated story text keyed by the exact completion request.
+
+    The key is a hash of the fully built prompt and sampling parameters
+    (model, messages, temperature, max_tokens), so only requests that would
+    be sent to OpenAI verbatim share an entry. Entries expire after ``ttl``
+    seconds. The most recent ``max_entries`` are kept in memory and, when
+    ``directory`` is set, every entry is also written to disk so the cache
+    survives restarts; the disk tier is pruned back to ``disk_entries``.
+    """
+
+    # Disk pruning runs after this many writes
+    PRUNE_EVERY = 100
+
+    def __init__(self, max_entries: int = 256, ttl: float = 86400,
+                 directory: Optional[str] = None, disk_entries: int = 5000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self.disk_entries = disk_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(params: dict) -> str:
+        raw = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached content for ``key``, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, entry)
+        return entry[1]
+
+    def put(self, key: str, content: str):
+        entry = (time.time() + self.ttl, content)
+        with self._lock:
+            self._remember(key, entry)
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        self._write_disk(key, entry)
+        if prune:
+            self._prune_disk()
+
+    def _remember(self, key: str, entry: tuple):
+        """Insert into the memory tier (lock held)"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, key: str, now: float) -> Optional[tuple]:
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError, PermissionError):
+            return None
+        if data.get("expires_at", 0) <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return (data["expires_at"], data["content"])
+
+    def _write_disk(self, key: str, entry: tuple):
+        if not self.directory:
+            return
+        try:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_json_atomic(path, {"expires_at": entry[0], "content": entry[1]})
+        except (IOError, PermissionError):
+            # On cloud platforms the disk tier may not be writable; memory still works
+            pass
+
+    def _prune_disk(self):
+        """Drop expired files and the oldest ones beyond ``disk_entries``"""
+        files = []
+        now = time.time()
+        try:
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    path = os.path.join(root, name)
+                    files.append((os.path.getmtime(path), path))
+        except OSError:
+            return
+        files.sort(reverse=True)
+        for i, (mtime, path) in enumerate(files):
+            if i >= self.disk_entries or mtime + self.ttl <= now:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries)
+        }
@@ -0,0 +1,331 @@
+"""
+Full-text search index for StoryWriterAgent
+"""
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Unicode-aware word pattern: covers Latin, Arabic and Urdu script alike
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Letter variants folded together so Arabic and Urdu spellings match.
+# Hamza/madda marks and harakat are stripped separately via _MARKS_RE.
+_LETTER_FOLDS = str.maketrans({
+    "ى": "ي",  # alef maksura -> yeh
+    "ی": "ي",  # Farsi/Urdu yeh -> yeh
+    "ے": "ي",  # Urdu barree yeh -> yeh
+    "ك": "ک",  # Arabic kaf -> keheh (Urdu kaf)
+    "ة": "ه",  # teh marbuta -> heh
+    "ہ": "ه",  # heh goal -> heh
+    "ھ": "ه",  # heh doachashmee -> heh
+    "ـ": None,      # tatweel
+})
+
+# Combining marks: Latin accents after NFKD plus Arabic harakat and Quranic marks
+_MARKS_RE = re.compile("[\u0300-\u036f\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed]")
+
+# Field weights: a hit in the prompt counts more than one in the body
+PROMPT_WEIGHT = 2
+GENRE_WEIGHT = 2
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into normalized search terms.
+
+    Handles every language in ``Config.LANGUAGES``: text is case folded,
+    accents and Arabic-script diacritics are dropped (é -> e, أ -> ا) and
+    Arabic/Urdu letter variants are folded so either spelling matches.
+    """
+    text = text.casefold()
+    if not text.isascii():
+        text = _MARKS_RE.sub("", unicodedata.normalize("NFKD", text)).translate(_LETTER_FOLDS)
+    return _WORD_RE.findall(text)
+
+
+class SearchIndex:
+    """Incrementally maintained inverted index with BM25-style ranking.
+
+    Stories are added and removed one at a time as the library changes, so
+    a query only touches the postings of its own terms instead of every
+    story body. Multi-term queries are ANDed and the last term is matched
+    as a prefix for type-ahead search.
+
+    Postings hold each story's BM25 term weight (saturated term frequency,
+    length-normalized against the average story length when the story was
+    indexed), so ranking at query time is a sum of ``idf * weight``.
+
+    A ranked query is exact: it walks each term's stories from the best
+    weight down and stops once no story it has not seen could reach the
+    current top ``limit`` (the threshold algorithm). The best-first order
+    of every term is kept up to date as stories come and go, so no query
+    pays to sort a term's postings.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    # Cap on vocabulary terms a single prefix may expand to
+    MAX_PREFIX_TERMS = 64
+    # A ranked query hands over to intersecting and scoring every match
+    # once it has walked 1/WALK_RATIO of its smallest group's postings; a
+    # walked posting costs about that many intersected ones
+    WALK_RATIO = 3
+    # Number of merged prefix expansions kept between mutations
+    MERGED_CACHE_SIZE = 256
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # Stories of each term, highest weight first
+        self._ranked: Dict[str, List[int]] = {}
+        self._doc_ids: Dict[int, str] = {}
+        self._doc_nums: Dict[str, int] = {}
+        self._doc_lengths: Dict[int, int] = {}
+        self._total_length = 0
+        self._next_num = 0
+        self._vocabulary: List[str] = []
+        self._new_terms = set()
+        # Merged prefix expansions, dropped whenever the postings change
+        self._merged_cache: "OrderedDict[str, Dict[int, float]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._doc_ids)
+
+    @staticmethod
+    def _term_counts(story: dict) -> Dict[str, int]:
+        counts = {}
+        for field, weight in (("content", 1), ("prompt", PROMPT_WEIGHT), ("genre", GENRE_WEIGHT)):
+            for term in tokenize(story.get(field) or ""):
+                counts[term] = counts.get(term, 0) + weight
+        return counts
+
+    def add(self, story: dict):
+        """Index a story; an id that is already indexed is left alone"""
+        added = self._add(story)
+        if added is None:
+            return
+        num, terms = added
+        for term in terms:
+            postings = self._postings[term]
+            bisect.insort(self._ranked[term], num, key=lambda n: -postings[n])
+
+    def add_many(self, stories: Iterable[dict]):
+        added: Dict[str, List[int]] = {}
+        for story in stories:
+            result = self._add(story)
+            if result is not None:
+                num, terms = result
+                for term in terms:
+                    added.setdefault(term, []).append(num)
+        # One sort per term instead of an insertion per posting; the ranked
+        # part is already in order, so this is close to linear
+        for term, nums in added.items():
+            ranked = self._ranked[term]
+            ranked.extend(nums)
+            ranked.sort(key=self._postings[term].__getitem__, reverse=True)
+
+    def _add(self, story: dict) -> Optional[Tuple[int, Iterable[str]]]:
+        """Record a story's postings and return its number and terms; the
+        caller places it in those terms' ranked lists"""
+        if story['id'] in self._doc_nums:
+            return None
+        num = self._next_num
+        self._next_num += 1
+        self._doc_ids[num] = story['id']
+        self._doc_nums[story['id']] = num
+
+        counts = self._term_counts(story)
+        length = sum(counts.values())
+        self._doc_lengths[num] = length
+        self._total_length += length
+
+        k1 = self.K1
+        avg_length = self._total_length / len(self._doc_ids)
+        norm = k1 * (1 - self.B + self.B * length / avg_length) if avg_length else k1
+        for term, tf in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._ranked[term] = []
+                self._new_terms.add(term)
+            postings[num] = tf * (k1 + 1) / (tf + norm)
+        self._merged_cache.clear()
+        return num, counts.keys()
+
+    def remove(self, story: dict):
+        """Drop a story; ``story`` must be the version that was indexed"""
+        num = self._doc_nums.pop(story['id'], None)
+        if num is None:
+            return
+        del self._doc_ids[num]
+        self._total_length -= self._doc_lengths.pop(num)
+
+        for term in self._term_counts(story):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            weight = postings.pop(num, None)
+            if weight is None:
+                continue
+            ranked = self._ranked[term]
+            # Equal weights may sit either side of ``num``
+            i = bisect.bisect_left(ranked, -weight, key=lambda n: -postings.get(n, weight))
+            while ranked[i] != num:
+                i += 1
+            del ranked[i]
+            if not postings:
+                del self._postings[term]
+                del self._ranked[term]
+                # Stale vocabulary entries are skipped at lookup time
+                self._new_terms.discard(term)
+        self._merged_cache.clear()
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        if self._new_terms:
+            self._vocabulary = sorted(
+                {t for t in self._vocabulary if t in self._postings} | self._new_terms
+            )
+            self._new_terms.clear()
+        vocabulary = self._vocabulary
+        terms = []
+        for i in range(bisect.bisect_left(vocabulary, prefix), len(vocabulary)):
+            term = vocabulary[i]
+            if not term.startswith(prefix):
+                break
+            if term in self._postings:
+                terms.append(term)
+                if len(terms) >= self.MAX_PREFIX_TERMS:
+                    break
+        return terms
+
+    def _best_first(self, terms: List[str]) -> Iterator[Tuple[float, int]]:
+        """``(weight, story)`` for stories containing any of ``terms``, highest
+        weight first, without duplicates"""
+        if len(terms) == 1:
+            postings = self._postings[terms[0]]
+            for num in self._ranked[terms[0]]:
+                yield postings[num], num
+            return
+        streams = [_by_weight(self._postings[t], self._ranked[t]) for t in terms]
+        seen = set()
+        for weight, num in heapq.merge(*streams):
+            if num not in seen:
+                seen.add(num)
+                yield -weight, num
+
+    def _merged(self, terms: List[str]) -> Dict[int, float]:
+        """Union of the postings of ``terms``; a story in several keeps one weight"""
+        if len(terms) == 1:
+            return self._postings[terms[0]]
+        key = "\0".join(terms)
+        merged = self._merged_cache.get(key)
+        if merged is not None:
+            self._merged_cache.move_to_end(key)
+            return merged
+        merged = {}
+        for term in terms:
+            merged.update(self._postings[term])
+        self._merged_cache[key] = merged
+        if len(self._merged_cache) > self.MERGED_CACHE_SIZE:
+            self._merged_cache.popitem(last=False)
+        return merged
+
+    def search(self, query: str, limit: int = None, prefix: bool = True,
+               after: Optional[Tuple[float, str]] = None) -> List[Tuple[str, float]]:
+        """Return ``(story_id, score)`` pairs for stories matching every term, best first.
+
+        ``after`` is a ``(score, story_id)`` pair from an earlier result;
+        only stories ranked below it are returned, so pages stay in line.
+        """
+        terms = tokenize(query)
+        if not terms or not self._doc_ids:
+            return []
+        # Each query term becomes the group of index terms it matches
+        groups = []
+        for i, term in enumerate(terms):
+            if prefix and i == len(terms) - 1:
+                group = self._prefix_terms(term)
+            else:
+                group = [term] if term in self._postings else []
+            if not group:
+                return []
+            groups.append(group)
+
+        doc_count = len(self._doc_ids)
+        weighted = []
+        for group in groups:
+            postings = self._merged(group)
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            weighted.append((postings, idf))
+
+        def score(num: int) -> float:
+            return sum(idf * postings[num] for postings, idf in weighted)
+
+        # Equal scores are ranked by index order; a story removed since
+        # keeps none, so every tie with it is kept
+        below = None if after is None else (after[0], self._doc_nums.get(after[1], math.inf))
+
+        def matching() -> List[Tuple[float, int]]:
+            # Intersecting and scoring a column at a time runs in C rather
+            # than a Python call per story; key views intersect from the
+            # smaller side
+            by_size = sorted((postings for postings, _ in weighted), key=len)
+            nums = by_size[0].keys()
+            for postings in by_size[1:]:
+                nums = postings.keys() & nums
+            nums = list(nums)
+            totals = [0.0] * len(nums)
+            for postings, idf in weighted:
+                totals = [total + idf * weight
+                          for total, weight in zip(totals, map(postings.__getitem__, nums))]
+            if below is None:
+                return list(zip(totals, nums))
+            return [entry for entry in zip(totals, nums) if entry < below]
+
+        if limit is None:
+            return [(self._doc_ids[num], s) for s, num in
+                    sorted(matching(), reverse=True)]
+        if limit <= 0:
+            return []
+
+        # Threshold algorithm: walk every group's stories best first in turn,
+        # keeping the top ``limit`` in a min-heap, until the best score an
+        # unseen story could still reach falls below it
+        streams = [self._best_first(group) for group in groups]
+        bounds = [max(self._postings[t][self._ranked[t][0]] for t in group) for group in groups]
+        top = []
+        seen = set()
+        walked = 0
+        max_walk = min(len(postings) for postings, _ in weighted) // self.WALK_RATIO
+        while len(top) < limit or sum(idf * bound for (_, idf), bound in zip(weighted, bounds)) >= top[0][0]:
+            if walked >= max_walk:
+                # Selective AND: score every match instead of walking on
+                top = heapq.nlargest(limit, matching())
+                break
+            for i, stream in enumerate(streams):
+                step = next(stream, None)
+                if step is None:
+                    # Every story in this group has been seen, so has every match
+                    return [(self._doc_ids[num], s) for s, num in sorted(top, reverse=True)]
+                bounds[i], num = step
+                walked += 1
+                if num in seen:
+                    continue
+                seen.add(num)
+                if all(num in postings for postings, _ in weighted):
+                    entry = (score(num), num)
+                    if below is not None and entry >= below:
+                        continue
+                    if len(top) < limit:
+                        heapq.heappush(top, entry)
+                    elif entry > top[0]:
+                        heapq.heapreplace(top, entry)
+        return [(self._doc_ids[num], s) for s, num in sorted(top, reverse=True)]
+
+
+def _by_weight(postings: Dict[int, float], ranked: List[int]) -> Iterator[Tuple[float, int]]:
+    """``(-weight, story)`` pairs in ascending order, for heapq.merge"""
+    for num in ranked:
+        yield -postings[num], num
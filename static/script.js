@@ -40,6 +40,10 @@ document.addEventListener('DOMContentLoaded', () => {
     let currentStory = null;
     let currentModalStory = null;
     let showingFavorites = false;
+    let nextPageUrl = null;
+
+    // List views only need the card fields, not full story bodies
+    const LIST_FIELDS = 'id,prompt,genre,tone,language,word_count,favorite,created_at';
 
     // Configure marked for markdown rendering
     if (typeof marked !== 'undefined') {
@@ -206,69 +210,52 @@ document.addEventListener('DOMContentLoaded', () => {
                 })
             });
 
+            if (response.status === 429 || response.status === 503) {
+                const retryAfter = response.headers.get('Retry-After');
+                throw new Error(`Server is busy, please try again in ${retryAfter || 'a few'} seconds`);
+            }
             if (!response.ok) throw new Error('Generation failed');
 
-            const reader = response.body.getReader();
-            const decoder = new TextDecoder();
-            let fullContent = '';
+            const stream = {
+                generationId: response.headers.get('X-Generation-Id'),
+                lastEventId: 0,
+                content: '',
+                story: null
+            };
 
             // Remove cursor for streaming
             storyContent.innerHTML = '';
 
-            while (true) {
-                const { done, value } = await reader.read();
-                if (done) break;
-
-                const chunk = decoder.decode(value);
-                const lines = chunk.split('\n');
-
-                for (const line of lines) {
-                    if (line.startsWith('data: ')) {
-                        const data = line.slice(6);
-                        if (data === '[DONE]') {
-                            // Story complete - render as markdown
-                            storyContent.innerHTML = renderMarkdown(fullContent);
-                            loadStories();
-                            showToast('Story generated successfully!', 'success');
-                        } else {
-                            try {
-                                const parsed = JSON.parse(data);
-                                if (parsed.content) {
-                                    fullContent += parsed.content;
-                                    // Show plain text during streaming
-                                    storyContent.textContent = fullContent;
-                                    storyContent.scrollTop = storyContent.scrollHeight;
-                                }
-                            } catch (e) {}
-                        }
-                    }
+            // If the connection drops mid-story, reattach and resume after the last chunk
+            let body = response.body;
+            for (let attempt = 0; ; attempt++) {
+                try {
+                    await readGenerationStream(body, stream);
+                    if (stream.story) break;
+                    throw new Error('Stream ended early');
+                } catch (error) {
+                    if (stream.story || !stream.generationId || attempt >= 5) throw error;
+                    await new Promise(resolve => setTimeout(resolve, 500 * (attempt + 1)));
+                    const resumed = await fetch(`/generate/${stream.generationId}/stream`, {
+                        headers: { 'Last-Event-ID': String(stream.lastEventId) }
+                    });
+                    if (!resumed.ok) throw error;
+                    body = resumed.body;
                 }
             }
 
-            // Update meta info
-            storyMeta.innerHTML = renderStoryTags({
-                genre: genreSelect.value,
-                tone: toneSelect.value,
-                language: languageSelect.value,
-                word_count: countWords(fullContent)
-            });
-
-            currentStory = {
-                content: fullContent,
-                genre: genreSelect.value,
-                tone: toneSelect.value,
-                language: languageSelect.value,
-                word_count: countWords(fullContent)
-            };
+            // Story complete - render as markdown
+            const story = stream.story;
+            storyContent.innerHTML = renderMarkdown(story.content);
+            loadStories();
+            showToast('Story generated successfully!', 'success');
 
-            favoriteBtn.textContent = '☆';
+            // Update meta info
+            storyMeta.innerHTML = renderStoryTags(story);
 
-            // Get the actual story ID from the server
-            const stories = await fetch('/stories').then(r => r.json());
-            if (stories.length > 0) {
-                currentStory.id = stories[0].id;
-                currentStory.favorite = stories[0].favorite;
-            }
+            // The done event carries the saved story, so no re-fetch is needed
+            currentStory = story;
+            favoriteBtn.textContent = story.favorite ? '★' : '☆';
 
         } catch (error) {
             storyContent.innerHTML = `<p style="color: var(--error);">Error generating story: ${error.message}</p>`;
@@ -280,17 +267,60 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    async function loadStories() {
-        try {
-            const endpoint = showingFavorites ? '/favorites' : '/stories';
-            const response = await fetch(endpoint);
-            const stories = await response.json();
-            renderStories(stories);
-        } catch (error) {
-            console.error('Error loading stories:', error);
+    // Read SSE frames from a /generate stream until the done event
+    async function readGenerationStream(body, stream) {
+        const reader = body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) return;
+
+            buffer += decoder.decode(value, { stream: true });
+            const frames = buffer.split('\n\n');
+            buffer = frames.pop();
+
+            for (const frame of frames) {
+                let eventId = null;
+                let eventType = 'message';
+                let data = '';
+                for (const line of frame.split('\n')) {
+                    if (line.startsWith('id: ')) eventId = parseInt(line.slice(4), 10);
+                    else if (line.startsWith('event: ')) eventType = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                }
+                if (!data) continue;
+
+                const parsed = JSON.parse(data);
+                if (eventType === 'generation') {
+                    stream.generationId = parsed.generation_id;
+                    continue;
+                }
+                if (eventId !== null) stream.lastEventId = eventId;
+
+                if (eventType === 'done') {
+                    stream.story = parsed.story;
+                    return;
+                } else if (eventType === 'error' || eventType === 'cancelled') {
+                    stream.story = null;
+                    stream.generationId = null;
+                    throw new Error(parsed.error || 'Generation cancelled');
+                } else if (parsed.content) {
+                    stream.content += parsed.content;
+                    // Show plain text during streaming
+                    storyContent.textContent = stream.content;
+                    storyContent.scrollTop = storyContent.scrollHeight;
+                }
+            }
         }
     }
 
+    async function loadStories() {
+        const endpoint = showingFavorites ? '/favorites' : '/stories';
+        await loadPage(`${endpoint}?fields=${LIST_FIELDS}`);
+    }
+
     async function searchStories() {
         const query = searchInput.value.trim();
         if (!query) {
@@ -298,17 +328,25 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
 
+        await loadPage(`/search?q=${encodeURIComponent(query)}&fields=${LIST_FIELDS}`);
+    }
+
+    async function loadPage(url, append = false) {
         try {
-            const response = await fetch(`/search?q=${encodeURIComponent(query)}`);
-            const stories = await response.json();
-            renderStories(stories);
+            const response = await fetch(url);
+            const page = await response.json();
+            const base = url.split('&cursor=')[0];
+            nextPageUrl = page.next_cursor ? `${base}&cursor=${encodeURIComponent(page.next_cursor)}` : null;
+            renderStories(page.items, append);
         } catch (error) {
-            console.error('Error searching stories:', error);
+            console.error('Error loading stories:', error);
         }
     }
 
-    function renderStories(stories) {
-        if (!stories.length) {
+    function renderStories(stories, append = false) {
+        storiesList.querySelector('.load-more-btn')?.remove();
+
+        if (!stories.length && !append) {
             storiesList.innerHTML = `
                 <div class="empty-message">
                     <div class="empty-icon">📝</div>
@@ -318,7 +356,7 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
 
-        storiesList.innerHTML = stories.map(story => {
+        const cards = stories.map(story => {
             const date = new Date(story.created_at).toLocaleDateString('en-US', {
                 month: 'short',
                 day: 'numeric',
@@ -349,9 +387,16 @@ document.addEventListener('DOMContentLoaded', () => {
             `;
         }).join('');
 
+        if (append) {
+            storiesList.insertAdjacentHTML('beforeend', cards);
+        } else {
+            storiesList.innerHTML = cards;
+        }
+
         // Add event listeners
-        storiesList.querySelectorAll('.story-card').forEach(card => {
+        storiesList.querySelectorAll('.story-card:not([data-bound])').forEach(card => {
             const id = card.dataset.id;
+            card.dataset.bound = 'true';
 
             card.querySelector('.view-btn').addEventListener('click', (e) => {
                 e.stopPropagation();
@@ -371,6 +416,14 @@ document.addEventListener('DOMContentLoaded', () => {
             // Click on card to view
             card.addEventListener('click', () => viewStory(id));
         });
+
+        if (nextPageUrl) {
+            const moreBtn = document.createElement('button');
+            moreBtn.className = 'btn btn-secondary load-more-btn';
+            moreBtn.textContent = 'Load more';
+            moreBtn.addEventListener('click', () => loadPage(nextPageUrl, true));
+            storiesList.appendChild(moreBtn);
+        }
     }
 
     async function viewStory(id) {
@@ -571,10 +624,6 @@ ${story.content}
         }
     }
 
-    function countWords(text) {
-        return text.trim().split(/\s+/).filter(w => w.length > 0).length;
-    }
-
     function debounce(func, wait) {
         let timeout;
         return function executedFunction(...args) {
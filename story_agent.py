@@ -1,42 +1,355 @@
 """
 Core story generation logic for StoryWriterAgent
 """
+import asyncio
+import base64
+import contextlib
 import json
-import os
+import threading
+import time
 import uuid
 from datetime import datetime
-from typing import Optional, Generator
-from openai import OpenAI
+from functools import cached_property
+from typing import AsyncContextManager, AsyncGenerator, Callable, Iterable, Iterator, Optional, Generator, List, Union
 from config import Config
+from story_store import create_store
+from search_index import SearchIndex
+from story_stats import StoryStats
+from story_buffer import StoryBuffer
+from story_export import export_library, format_story
+from rate_limit import TokenBucket, estimate_tokens
+from response_cache import ResponseCache
+from metrics import TOKEN_COUNT_BUCKETS, TOKEN_GAP_BUCKETS, counter, gauge, histogram
+
+MODEL_REQUESTS = counter("storywriter_model_requests_total",
+                         "Chat completion requests by mode and outcome", ("mode", "outcome"))
+MODEL_IN_FLIGHT = gauge("storywriter_model_requests_in_flight",
+                        "Chat completion requests currently running", ("mode",))
+MODEL_DURATION = histogram("storywriter_model_request_duration_seconds",
+                           "Total duration of chat completion requests", ("mode",))
+MODEL_TTFT = histogram("storywriter_model_time_to_first_token_seconds",
+                       "Time from request to the first streamed token", ("mode",))
+MODEL_TOKEN_GAP = histogram("storywriter_model_inter_token_seconds",
+                            "Gap between consecutive streamed tokens", ("mode",), TOKEN_GAP_BUCKETS)
+MODEL_TOKENS = histogram("storywriter_model_tokens",
+                         "Tokens per chat completion, from its reported usage", ("type",),
+                         TOKEN_COUNT_BUCKETS)
+STORE_DURATION = histogram("storywriter_store_operation_duration_seconds",
+                           "Story store operation latency", ("backend", "op"))
+INDEX_DURATION = histogram("storywriter_index_operation_duration_seconds",
+                           "Search index operation latency", ("op",))
+
+
+def _encode_cursor(position: dict) -> str:
+    """Opaque pagination cursor"""
+    raw = json.dumps(position, separators=(",", ":")).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, dict):
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def _project(story: dict, fields: Optional[List[str]]) -> dict:
+    """Keep only the requested fields (the id is always included)"""
+    if not fields:
+        return story
+    return {key: value for key, value in story.items() if key == 'id' or key in fields}
+
+
+class _ModelCall:
+    """Records metrics for one chat completion request"""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.last_token = None
+        self.finished = False
+        MODEL_IN_FLIGHT.inc(mode=mode)
+
+    def token(self):
+        now = time.perf_counter()
+        if self.last_token is None:
+            MODEL_TTFT.observe(now - self.started, mode=self.mode)
+        else:
+            MODEL_TOKEN_GAP.observe(now - self.last_token, mode=self.mode)
+        self.last_token = now
+
+    def usage(self, usage):
+        if usage is not None:
+            MODEL_TOKENS.observe(usage.prompt_tokens or 0, type="prompt")
+            MODEL_TOKENS.observe(usage.completion_tokens or 0, type="completion")
+
+    def finish(self, outcome: str = "ok"):
+        if self.finished:
+            return
+        self.finished = True
+        MODEL_IN_FLIGHT.dec(mode=self.mode)
+        MODEL_DURATION.observe(time.perf_counter() - self.started, mode=self.mode)
+        MODEL_REQUESTS.inc(mode=self.mode, outcome=outcome)
 
 
 class StoryAgent:
-    def __init__(self):
-        Config.validate()
-        self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
-        self.stories = self._load_stories()
-
-    def _load_stories(self) -> list:
-        """Load stories from storage (in-memory for cloud deployment)"""
-        # For cloud deployment, use in-memory storage
-        # Stories won't persist between restarts on free tier
-        try:
-            if os.path.exists(Config.STORIES_FILE):
-                with open(Config.STORIES_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-        except (json.JSONDecodeError, IOError, PermissionError):
-            pass
-        return []
-
-    def _save_stories(self):
-        """Save stories to storage"""
+    """Story generation and the story library.
+
+    Construction is cheap: the OpenAI SDK is imported when a client is
+    first used, the store is opened on first access and the search index
+    and stats are built when first needed, so CLI commands that only show
+    help or examples never pay for them.
+
+    Concurrency model (threaded servers, Streamlit sessions, batch workers):
+
+    - Writes (new stories, delete, favorite) are serialized by one lock
+      that covers the store write together with the index and stats
+      updates, so the three never disagree.
+    - Store reads (listing, paging, lookups) take no agent lock. The
+      in-memory stores replace story records instead of mutating them
+      and readers copy the ordering lists before walking them; SQLite
+      reads use pooled connections of their own.
+    - Stats are published as an immutable snapshot after every write,
+      so ``get_stats`` never waits for a writer.
+    - The search index has its own lock, shared by searches and index
+      updates; a search waits at most for one index update. The first
+      search builds it from a store snapshot while writes carry on.
+    """
+
+    def __init__(self, require_api_key: bool = True):
+        # Front ends where each user brings their own key (Streamlit) skip the
+        # check and pass a client per call instead
+        if require_api_key:
+            Config.validate()
+        self._backend = Config.STORAGE_BACKEND.lower()
+        self._lock = threading.RLock()
+        self._index_lock = threading.Lock()
+        # One thread builds the index while other searches wait for it
+        self._index_build_lock = threading.Lock()
+        self._store = None
+        self._index: Optional[SearchIndex] = None
+        # This process's writes made while the index is being built
+        self._index_backlog: Optional[List[tuple]] = None
+        self._stats: Optional[StoryStats] = None
+        # Store seq each of them is current with (None for stores without one)
+        self._index_seq: Optional[int] = None
+        self._stats_seq: Optional[int] = None
+        # Read-only copy of the stats for lock-free readers
+        self._stats_view: Optional[dict] = None
+        # Library version for stores without a persistent seq: a counter
+        # bumped on every write, tagged so it never repeats across restarts
+        self._epoch = uuid.uuid4().hex[:8]
+        self._writes = 0
+        self._stats_saved_at = time.monotonic()
+        # Shared by every batch so parallel batches stay within one budget
+        self.token_budget = TokenBucket(Config.BATCH_TOKENS_PER_MINUTE)
+        self.cache = ResponseCache(
+            max_entries=Config.RESPONSE_CACHE_SIZE,
+            ttl=Config.RESPONSE_CACHE_TTL,
+            directory=Config.RESPONSE_CACHE_DIR,
+            disk_entries=Config.RESPONSE_CACHE_DISK_ENTRIES
+        )
+
+    @cached_property
+    def client(self):
+        from http_client import get_client
+        return get_client()
+
+    @cached_property
+    def async_client(self):
+        from http_client import get_async_client
+        return get_async_client()
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = create_store()
+        return self._store
+
+    @property
+    def index(self) -> SearchIndex:
+        if self._index is None:
+            with self._index_build_lock:
+                if self._index is None:
+                    self._build_index()
+        return self._index
+
+    def _build_index(self):
+        """Build the index from a store snapshot without holding off writers.
+
+        Writes made meanwhile are caught up afterwards under the lock: from
+        the change feed for shared stores, otherwise from a backlog kept by
+        ``_written``. Adding and removing are idempotent, so replaying a
+        write the snapshot already saw is harmless.
+        """
+        with self._lock:
+            self._index_backlog = []
         try:
-            os.makedirs(Config.STORIES_DIR, exist_ok=True)
-            with open(Config.STORIES_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.stories, f, ensure_ascii=False, indent=2)
-        except (IOError, PermissionError):
-            # On cloud platforms, file storage may not be available
-            pass
+            index = SearchIndex()
+            with INDEX_DURATION.time(op="build"), self.store.snapshot() as (seq, stories):
+                index.add_many(stories)
+            with self._lock:
+                self._apply(self._index_backlog, index=index)
+                self._index, self._index_seq = index, seq
+        finally:
+            with self._lock:
+                self._index_backlog = None
+        self._sync()
+
+    @property
+    def stats(self) -> StoryStats:
+        if self._stats is None:
+            with self._lock:
+                if self._stats is None:
+                    self._stats, self._stats_seq = self._load_stats()
+                    self._stats_view = self._stats.to_dict()
+        return self._stats
+
+    def _load_stats(self) -> tuple:
+        """Use the stats saved with the store if they are current, else recount"""
+        saved = self.store.load_meta("stats")
+        with self.store.snapshot() as (seq, stories):
+            if saved and seq is not None and saved.get("seq") == seq:
+                return StoryStats.from_snapshot(saved), seq
+            return StoryStats.rebuild(stories), seq
+
+    def _save_stats(self, force: bool = False):
+        """Persist running stats, at most once per STATS_SAVE_INTERVAL seconds (lock held)"""
+        now = time.monotonic()
+        if not force and now - self._stats_saved_at < Config.STATS_SAVE_INTERVAL:
+            return
+        if self._stats is not None and self._stats_seq is not None:
+            self.store.save_meta("stats", dict(self._stats.snapshot(), seq=self._stats_seq))
+        self._stats_saved_at = now
+
+    def _apply(self, changes: Iterable[tuple], index: Optional[SearchIndex] = None,
+               stats: Optional[StoryStats] = None):
+        """Apply ``(op, payload)`` store mutations to the given index and stats (lock held)"""
+        changes = list(changes)
+        if index is not None and changes:
+            with self._index_lock:
+                for op, payload in changes:
+                    if op == "create":
+                        with INDEX_DURATION.time(op="add"):
+                            index.add(payload)
+                    elif op == "delete":
+                        with INDEX_DURATION.time(op="remove"):
+                            index.remove(payload)
+        if stats is not None and changes:
+            for op, payload in changes:
+                if op == "create":
+                    stats.add(payload)
+                elif op == "delete":
+                    stats.remove(payload)
+                elif op == "favorite":
+                    stats.favorite_changed(payload)
+            self._stats_view = stats.to_dict()
+
+    def _sync(self):
+        """Catch the index and stats up with writes from other processes.
+
+        Only shared stores (SQLite) have other writers; their change feed
+        also carries this process's own writes, which are applied here too.
+        """
+        if not self.store.shared:
+            return
+        loaded = [seq for seq, part in ((self._index_seq, self._index),
+                                        (self._stats_seq, self._stats)) if part is not None]
+        if not loaded or min(loaded) == self.store.seq:
+            # Nothing new: readers skip the write lock
+            return
+        with self._lock:
+            loaded = [seq for seq, part in ((self._index_seq, self._index),
+                                            (self._stats_seq, self._stats)) if part is not None]
+            if not loaded:
+                return
+            changes = self.store.changes_since(min(loaded))
+            if changes is None:
+                # Too far behind the feed; rebuild both on next use
+                self._index = self._stats = self._stats_view = None
+                self._index_seq = self._stats_seq = None
+                return
+            if not changes:
+                return
+            if self._index is not None:
+                self._apply(((op, payload) for seq, op, payload in changes if seq > self._index_seq),
+                            index=self._index)
+                self._index_seq = max(self._index_seq, changes[-1][0])
+            if self._stats is not None:
+                self._apply(((op, payload) for seq, op, payload in changes if seq > self._stats_seq),
+                            stats=self._stats)
+                self._stats_seq = max(self._stats_seq, changes[-1][0])
+
+    def _written(self, changes: List[tuple]):
+        """Update the index and stats after this process changed the store (lock held)"""
+        self._writes += 1
+        if self.store.shared:
+            self._sync()
+        else:
+            self._apply(changes, self._index, self._stats)
+            if self._index_backlog is not None:
+                self._index_backlog.extend(changes)
+        self._save_stats()
+
+    def _add_story(self, story: dict):
+        """Persist a new story and update the index and stats"""
+        self._add_stories([story])
+
+    def _add_stories(self, stories: List[dict]):
+        """Persist several new stories with one store write"""
+        if not stories:
+            return
+        with self._lock:
+            with STORE_DURATION.time(backend=self._backend, op="add_many" if len(stories) > 1 else "add"):
+                if len(stories) == 1:
+                    self.store.add(stories[0])
+                else:
+                    self.store.add_many(stories)
+            self._written([("create", story) for story in stories])
+
+    @property
+    def version(self) -> str:
+        """Library version for cache validators; changes with every write.
+
+        Stores with a persistent seq (SQLite) use it, so every worker
+        hands out the same version for the same library state.
+        """
+        seq = self.store.seq
+        if seq is not None:
+            return str(seq)
+        return f"{self._epoch}.{self._writes}"
+
+    def open(self) -> "StoryAgent":
+        """Open the store now rather than on first use"""
+        self.store
+        return self
+
+    def flush(self):
+        """Make every accepted write durable now (see ``Config.STORAGE_DURABILITY``)"""
+        with self._lock:
+            if self._store is not None:
+                self._save_stats(force=True)
+                self._store.flush()
+
+    def close(self):
+        """Save running stats, flush pending writes and release the store.
+
+        Safe to call more than once; the next use opens the store again.
+        """
+        with self._lock:
+            if self._store is None:
+                return
+            self._save_stats(force=True)
+            self._store.close()
+            self._store = None
+            self._index = self._stats = self._stats_view = None
+            self._index_seq = self._stats_seq = None
 
     def _build_prompt(self, user_prompt: str, genre: str, tone: str,
                       length: str, language: str) -> str:
@@ -59,25 +372,75 @@ Write the story now:"""
 
         return system_prompt
 
-    def generate_story(self, prompt: str, genre: str = "Fantasy",
-                       tone: str = "Serious", length: str = "medium",
-                       language: str = "English") -> dict:
-        """Generate a complete story"""
+    def _completion_params(self, prompt: str, genre: str, tone: str,
+                           length: str, language: str) -> dict:
+        """Chat completion parameters shared by every generation path"""
         full_prompt = self._build_prompt(prompt, genre, tone, length, language)
-
-        response = self.client.chat.completions.create(
-            model=Config.OPENAI_MODEL,
-            messages=[
+        return {
+            "model": Config.OPENAI_MODEL,
+            "messages": [
                 {"role": "system", "content": "You are a creative story writer."},
                 {"role": "user", "content": full_prompt}
             ],
-            temperature=0.8,
-            max_tokens=2000
-        )
-
-        story_content = response.choices[0].message.content
+            "temperature": 0.8,
+            "max_tokens": 2000
+        }
 
-        story = {
+    def request_key(self, prompt: str, genre: str, tone: str, length: str, language: str) -> str:
+        """Hash of the exact completion request, shared by caching and coalescing"""
+        return self.cache.key(self._completion_params(prompt, genre, tone, length, language))
+
+    def request_tokens(self, prompt: str, genre: str, tone: str, length: str, language: str) -> int:
+        """Upper estimate of the tokens a generation request may use"""
+        return estimate_tokens(self._completion_params(prompt, genre, tone, length, language))
+
+    def _cache_lookup(self, params: dict, cache: Optional[bool]) -> tuple:
+        """Return ``(key, cached content)``; the key is None when caching is off"""
+        if not (Config.RESPONSE_CACHE if cache is None else cache):
+            return None, None
+        key = self.cache.key(params)
+        return key, self.cache.get(key)
+
+    async def _acache_lookup(self, params: dict, cache: Optional[bool]) -> tuple:
+        """:meth:`_cache_lookup` in a thread, since it may read the disk tier"""
+        if not (Config.RESPONSE_CACHE if cache is None else cache):
+            return None, None
+        return await asyncio.to_thread(self._cache_lookup, params, cache)
+
+    def _complete(self, params: dict, mode: str = "complete"):
+        """Blocking chat completion, timed for the metrics endpoint"""
+        call = _ModelCall(mode)
+        try:
+            response = self.client.chat.completions.create(**params)
+        except BaseException:
+            call.finish("error")
+            raise
+        call.usage(getattr(response, "usage", None))
+        call.finish()
+        return response
+
+    async def _acomplete(self, params: dict, mode: str = "complete", client=None):
+        """Async chat completion, timed for the metrics endpoint"""
+        call = _ModelCall(mode)
+        try:
+            response = await (client or self.async_client).chat.completions.create(**params)
+        except asyncio.CancelledError:
+            call.finish("cancelled")
+            raise
+        except BaseException:
+            call.finish("error")
+            raise
+        call.usage(getattr(response, "usage", None))
+        call.finish()
+        return response
+
+    @staticmethod
+    def _new_story(prompt: str, genre: str, tone: str, length: str,
+                   language: str, story_content: str, word_count: Optional[int] = None) -> dict:
+        """Build the story record for generated content"""
+        if word_count is None:
+            word_count = len(story_content.split())
+        return {
             "id": str(uuid.uuid4()),
             "prompt": prompt,
             "content": story_content,
@@ -87,159 +450,448 @@ Write the story now:"""
             "language": language,
             "created_at": datetime.now().isoformat(),
             "favorite": False,
-            "word_count": len(story_content.split())
+            "word_count": word_count
         }
 
-        self.stories.append(story)
-        self._save_stories()
+    def _save_partial(self, prompt: str, genre: str, tone: str, length: str, language: str,
+                      buffer: StoryBuffer, save_partial: Optional[bool]) -> Optional[dict]:
+        """Persist the text received before a stream was cancelled, flagged incomplete"""
+        if not (Config.SAVE_PARTIAL_STORIES if save_partial is None else save_partial):
+            return None
+        if not buffer.word_count:
+            return None
+        story = self._new_story(prompt, genre, tone, length, language,
+                                buffer.text(), buffer.word_count)
+        story["incomplete"] = True
+        self._add_story(story)
+        return story
+
+    def generate_story(self, prompt: str, genre: str = "Fantasy",
+                       tone: str = "Serious", length: str = "medium",
+                       language: str = "English", cache: Optional[bool] = None) -> dict:
+        """Generate a complete story"""
+        params = self._completion_params(prompt, genre, tone, length, language)
+        cache_key, story_content = self._cache_lookup(params, cache)
+        if story_content is None:
+            response = self._complete(params)
+            story_content = response.choices[0].message.content
+            if cache_key:
+                self.cache.put(cache_key, story_content)
+        story = self._new_story(prompt, genre, tone, length, language, story_content)
+        self._add_story(story)
 
         return story
 
     def generate_story_stream(self, prompt: str, genre: str = "Fantasy",
                               tone: str = "Serious", length: str = "medium",
-                              language: str = "English") -> Generator[str, None, dict]:
-        """Generate a story with streaming for typewriter effect"""
-        full_prompt = self._build_prompt(prompt, genre, tone, length, language)
+                              language: str = "English", cache: Optional[bool] = None,
+                              save_partial: Optional[bool] = None,
+                              client=None) -> Generator[str, None, dict]:
+        """Generate a story with streaming for typewriter effect.
+
+        Closing the generator (or Ctrl+C while it reads) closes the OpenAI
+        stream right away; with ``save_partial`` the text so far is saved
+        as an incomplete story. ``client`` replaces the shared OpenAI
+        client, e.g. one built from a user's own API key.
+        """
+        params = self._completion_params(prompt, genre, tone, length, language)
+        cache_key, cached = self._cache_lookup(params, cache)
+        buffer = StoryBuffer()
+        if cached is not None:
+            buffer.append(cached)
+            yield cached
+        else:
+            call = _ModelCall("stream")
+            try:
+                stream = (client or self.client).chat.completions.create(
+                    **params, stream=True, stream_options={"include_usage": True}
+                )
+            except BaseException:
+                call.finish("error")
+                raise
+            try:
+                for chunk in stream:
+                    call.usage(getattr(chunk, "usage", None))
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        content = chunk.choices[0].delta.content
+                        call.token()
+                        buffer.append(content)
+                        yield content
+            except (GeneratorExit, KeyboardInterrupt):
+                call.finish("cancelled")
+                self._save_partial(prompt, genre, tone, length, language, buffer, save_partial)
+                raise
+            except BaseException:
+                call.finish("error")
+                raise
+            finally:
+                call.finish()
+                stream.close()
+            if cache_key:
+                self.cache.put(cache_key, buffer.text())
+
+        story = self._new_story(prompt, genre, tone, length, language,
+                                buffer.text(), buffer.word_count)
+        self._add_story(story)
 
-        stream = self.client.chat.completions.create(
-            model=Config.OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": "You are a creative story writer."},
-                {"role": "user", "content": full_prompt}
-            ],
-            temperature=0.8,
-            max_tokens=2000,
-            stream=True
-        )
+        return story
 
-        story_content = ""
-        for chunk in stream:
-            if chunk.choices[0].delta.content:
-                content = chunk.choices[0].delta.content
-                story_content += content
-                yield content
+    async def agenerate_story(self, prompt: str, genre: str = "Fantasy",
+                              tone: str = "Serious", length: str = "medium",
+                              language: str = "English", cache: Optional[bool] = None) -> dict:
+        """Generate a complete story without blocking the event loop"""
+        params = self._completion_params(prompt, genre, tone, length, language)
+        cache_key, story_content = await self._acache_lookup(params, cache)
+        if story_content is None:
+            response = await self._acomplete(params)
+            story_content = response.choices[0].message.content
+            if cache_key:
+                await asyncio.to_thread(self.cache.put, cache_key, story_content)
+        story = self._new_story(prompt, genre, tone, length, language, story_content)
+        await asyncio.to_thread(self._add_story, story)
 
-        story = {
-            "id": str(uuid.uuid4()),
-            "prompt": prompt,
-            "content": story_content,
-            "genre": genre,
-            "tone": tone,
-            "length": length,
-            "language": language,
-            "created_at": datetime.now().isoformat(),
-            "favorite": False,
-            "word_count": len(story_content.split())
-        }
+        return story
 
-        self.stories.append(story)
-        self._save_stories()
+    async def agenerate_story_stream(self, prompt: str, genre: str = "Fantasy",
+                                     tone: str = "Serious", length: str = "medium",
+                                     language: str = "English", cache: Optional[bool] = None,
+                                     on_complete: Optional[Callable[[dict], None]] = None,
+                                     save_partial: Optional[bool] = None
+                                     ) -> AsyncGenerator[str, None]:
+        """Stream a story without blocking the event loop.
+
+        Async generators cannot return a value, so the saved story is passed
+        to ``on_complete`` once the stream has finished. Cancelling the task
+        or closing the generator closes the OpenAI stream; with
+        ``save_partial`` the text so far is saved as an incomplete story and
+        also passed to ``on_complete``.
+        """
+        params = self._completion_params(prompt, genre, tone, length, language)
+        cache_key, cached = await self._acache_lookup(params, cache)
+        buffer = StoryBuffer()
+        if cached is not None:
+            buffer.append(cached)
+            yield cached
+        else:
+            call = _ModelCall("stream")
+            try:
+                stream = await self.async_client.chat.completions.create(
+                    **params, stream=True, stream_options={"include_usage": True}
+                )
+            except asyncio.CancelledError:
+                call.finish("cancelled")
+                raise
+            except BaseException:
+                call.finish("error")
+                raise
+            try:
+                async for chunk in stream:
+                    call.usage(getattr(chunk, "usage", None))
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        content = chunk.choices[0].delta.content
+                        call.token()
+                        buffer.append(content)
+                        yield content
+            except (GeneratorExit, asyncio.CancelledError):
+                call.finish("cancelled")
+                # Release the upstream connection before the store write
+                await stream.close()
+                story = await asyncio.to_thread(self._save_partial, prompt, genre, tone, length,
+                                                language, buffer, save_partial)
+                if story and on_complete:
+                    on_complete(story)
+                raise
+            except BaseException:
+                call.finish("error")
+                raise
+            finally:
+                call.finish()
+                await stream.close()
+            if cache_key:
+                await asyncio.to_thread(self.cache.put, cache_key, buffer.text())
+
+        story = self._new_story(prompt, genre, tone, length, language,
+                                buffer.text(), buffer.word_count)
+        await asyncio.to_thread(self._add_story, story)
+        if on_complete:
+            on_complete(story)
+
+    @staticmethod
+    def _batch_item(item: Union[str, dict]) -> dict:
+        """Story options for one batch entry; a bare string is a prompt"""
+        if isinstance(item, str):
+            item = {"prompt": item}
+        if not isinstance(item, dict) or not str(item.get("prompt") or "").strip():
+            raise ValueError("Each batch entry needs a prompt")
+        return {
+            "prompt": item["prompt"],
+            "genre": item.get("genre") or "Fantasy",
+            "tone": item.get("tone") or "Serious",
+            "length": item.get("length") or "medium",
+            "language": item.get("language") or "English"
+        }
 
-        return story
+    async def agenerate_batch(self, items: Iterable[Union[str, dict]],
+                              concurrency: Optional[int] = None,
+                              token_budget: Optional[TokenBucket] = None,
+                              cache: Optional[bool] = None, client=None,
+                              slot: Optional[Callable[[], AsyncContextManager]] = None
+                              ) -> AsyncGenerator[dict, None]:
+        """Generate many stories concurrently, yielding results as they complete.
+
+        At most ``concurrency`` completions are in flight and each one first
+        reserves its estimated tokens from the agent-wide budget and, if
+        given, from ``token_budget`` too (e.g. a per-batch limit or the web
+        server's global budget). Every entry yields ``{"index", "story"}`` or
+        ``{"index", "error"}``. Finished stories are written to the store in
+        groups of ``Config.BATCH_WRITE_SIZE`` rather than one by one.
+        ``client`` replaces the shared AsyncOpenAI client, e.g. with one
+        bound to another event loop. ``slot()``, if given, is held around
+        each upstream call (e.g. the web server's admission slots).
+        """
+        concurrency = max(1, min(concurrency or Config.BATCH_CONCURRENCY,
+                                 Config.MAX_BATCH_CONCURRENCY))
+        budgets = [self.token_budget]
+        if token_budget is not None and token_budget is not self.token_budget:
+            budgets.append(token_budget)
+        entries = enumerate(items)
+        results = asyncio.Queue()
+
+        async def generate(item):
+            options = self._batch_item(item)
+            params = self._completion_params(**options)
+            cache_key, story_content = await self._acache_lookup(params, cache)
+            if story_content is not None:
+                return self._new_story(story_content=story_content, **options)
+            reserved = estimate_tokens(params)
+            for budget in budgets:
+                await budget.acquire(reserved)
+            try:
+                async with slot() if slot else contextlib.nullcontext():
+                    response = await self._acomplete(params, mode="batch", client=client)
+            except BaseException:
+                for budget in budgets:
+                    budget.refund(reserved)
+                raise
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                for budget in budgets:
+                    budget.refund(reserved - usage.prompt_tokens - usage.completion_tokens)
+            story_content = response.choices[0].message.content or ""
+            if cache_key:
+                await asyncio.to_thread(self.cache.put, cache_key, story_content)
+            return self._new_story(story_content=story_content, **options)
+
+        async def worker():
+            # Workers share one iterator, so the input can be a lazy stream
+            try:
+                for index, item in entries:
+                    try:
+                        result = {"index": index, "story": await generate(item)}
+                    except Exception as e:
+                        result = {"index": index, "error": str(e)}
+                    results.put_nowait(result)
+            finally:
+                results.put_nowait(None)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        pending = []
+        try:
+            finished = 0
+            while finished < len(workers):
+                result = await results.get()
+                if result is None:
+                    finished += 1
+                    continue
+                if "story" in result:
+                    pending.append(result["story"])
+                    if len(pending) >= Config.BATCH_WRITE_SIZE:
+                        await asyncio.to_thread(self._add_stories, pending)
+                        pending = []
+                yield result
+        finally:
+            for task in workers:
+                task.cancel()
+            # Keep whatever finished even if the consumer went away early
+            while not results.empty():
+                result = results.get_nowait()
+                if result and "story" in result:
+                    pending.append(result["story"])
+            await asyncio.to_thread(self._add_stories, pending)
+
+    def generate_batch(self, items: Iterable[Union[str, dict]],
+                       concurrency: Optional[int] = None,
+                       token_budget: Optional[TokenBucket] = None,
+                       cache: Optional[bool] = None) -> Generator[dict, None, None]:
+        """Blocking wrapper around :meth:`agenerate_batch` for scripts and the CLI"""
+        from http_client import new_async_client
+        loop = asyncio.new_event_loop()
+        # The shared async client's pool is bound to the first loop that used
+        # it, so each call's private loop gets a client of its own
+        client = new_async_client()
+        batch = self.agenerate_batch(items, concurrency, token_budget, cache, client=client)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(batch.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(batch.aclose())
+            loop.run_until_complete(client.close())
+            loop.close()
 
     def get_all_stories(self) -> list:
         """Get all stories"""
-        return sorted(self.stories, key=lambda x: x['created_at'], reverse=True)
+        return self.store.list_stories()
+
+    @staticmethod
+    def _page_size(limit: Optional[int]) -> int:
+        if not limit or limit < 1:
+            return Config.PAGE_SIZE
+        return min(limit, Config.MAX_PAGE_SIZE)
+
+    def get_stories_page(self, limit: Optional[int] = None, cursor: Optional[str] = None,
+                         favorites_only: bool = False, fields: Optional[List[str]] = None) -> dict:
+        """Get one page of stories, newest first, with a cursor for the next page"""
+        limit = self._page_size(limit)
+        before = None
+        if cursor:
+            before = _decode_cursor(cursor).get("before")
+            if (not isinstance(before, list) or len(before) != 2
+                    or not all(isinstance(part, str) for part in before)):
+                raise ValueError("Invalid cursor")
+
+        with STORE_DURATION.time(backend=self._backend, op="list_page"):
+            stories = self.store.list_page(limit + 1, before, favorites_only=favorites_only)
+        next_cursor = None
+        if len(stories) > limit:
+            stories = stories[:limit]
+            last = stories[-1]
+            next_cursor = _encode_cursor({"before": [last['created_at'], last['id']]})
+        return {"items": [_project(s, fields) for s in stories], "next_cursor": next_cursor}
 
     def get_story(self, story_id: str) -> Optional[dict]:
         """Get a specific story by ID"""
-        for story in self.stories:
-            if story['id'] == story_id:
-                return story
-        return None
+        return self.store.get(story_id)
 
     def delete_story(self, story_id: str) -> bool:
         """Delete a story by ID"""
-        for i, story in enumerate(self.stories):
-            if story['id'] == story_id:
-                del self.stories[i]
-                self._save_stories()
-                return True
-        return False
+        with self._lock:
+            story = self.store.get(story_id)
+            if not story:
+                return False
+            with STORE_DURATION.time(backend=self._backend, op="delete"):
+                deleted = self.store.delete(story_id)
+            if not deleted:
+                return False
+            self._written([("delete", story)])
+        return True
 
     def toggle_favorite(self, story_id: str) -> Optional[dict]:
         """Toggle favorite status of a story"""
-        for story in self.stories:
-            if story['id'] == story_id:
-                story['favorite'] = not story['favorite']
-                self._save_stories()
-                return story
-        return None
+        # The store flips the flag atomically, so concurrent toggles from
+        # other workers are never lost
+        with self._lock:
+            with STORE_DURATION.time(backend=self._backend, op="toggle_favorite"):
+                story = self.store.toggle_favorite(story_id)
+            if story:
+                self._written([("favorite", story['favorite'])])
+        return story
 
     def get_favorites(self) -> list:
         """Get all favorite stories"""
-        return [s for s in self.stories if s.get('favorite', False)]
+        return self.store.list_stories(favorites_only=True)
 
     def search_stories(self, query: str) -> list:
-        """Search stories by content, prompt, or genre"""
-        query = query.lower()
-        results = []
-        for story in self.stories:
-            if (query in story['content'].lower() or
-                query in story['prompt'].lower() or
-                query in story['genre'].lower()):
-                results.append(story)
-        return sorted(results, key=lambda x: x['created_at'], reverse=True)
+        """Search stories by content, prompt, or genre, best matches first"""
+        self._sync()
+        index = self.index
+        with self._index_lock, INDEX_DURATION.time(op="search"):
+            hits = index.search(query)
+        with STORE_DURATION.time(backend=self._backend, op="get_many"):
+            return self.store.get_many([story_id for story_id, _ in hits])
+
+    def search_stories_page(self, query: str, limit: Optional[int] = None,
+                            cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> dict:
+        """Get one page of ranked search results with a cursor for the next page"""
+        limit = self._page_size(limit)
+        after = None
+        if cursor:
+            after = _decode_cursor(cursor).get("after")
+            if (not isinstance(after, list) or len(after) != 2
+                    or not isinstance(after[0], (int, float)) or not isinstance(after[1], str)):
+                raise ValueError("Invalid cursor")
+
+        self._sync()
+        index = self.index
+        with self._index_lock, INDEX_DURATION.time(op="search"):
+            hits = index.search(query, limit=limit + 1, after=after)
+        page = hits[:limit]
+        next_cursor = None
+        if len(hits) > limit:
+            story_id, score = page[-1]
+            next_cursor = _encode_cursor({"after": [score, story_id]})
+        with STORE_DURATION.time(backend=self._backend, op="get_many"):
+            stories = self.store.get_many([story_id for story_id, _ in page])
+        return {"items": [_project(s, fields) for s in stories], "next_cursor": next_cursor}
 
     def get_stats(self) -> dict:
         """Get writing statistics"""
-        total_stories = len(self.stories)
-        total_words = sum(s.get('word_count', 0) for s in self.stories)
-        favorites_count = len(self.get_favorites())
-
-        genre_counts = {}
-        tone_counts = {}
-        language_counts = {}
-
-        for story in self.stories:
-            genre = story.get('genre', 'Unknown')
-            tone = story.get('tone', 'Unknown')
-            language = story.get('language', 'Unknown')
-
-            genre_counts[genre] = genre_counts.get(genre, 0) + 1
-            tone_counts[tone] = tone_counts.get(tone, 0) + 1
-            language_counts[language] = language_counts.get(language, 0) + 1
-
-        return {
-            "total_stories": total_stories,
-            "total_words": total_words,
-            "favorites": favorites_count,
-            "average_words": total_words // total_stories if total_stories > 0 else 0,
-            "genres": genre_counts,
-            "tones": tone_counts,
-            "languages": language_counts
-        }
+        self._sync()
+        view = self._stats_view
+        if view is None:
+            with self._lock:
+                # Loading the stats publishes a fresh view
+                self.stats
+                view = self._stats_view
+        return view
+
+    def get_runtime_stats(self) -> dict:
+        """Process-level counters (not library statistics)"""
+        from http_client import pool_stats
+        return {"response_cache": self.cache.stats(), "http_pool": pool_stats()}
 
     def export_story(self, story_id: str, format: str = "txt") -> Optional[str]:
         """Export a story to a specific format"""
         story = self.get_story(story_id)
         if not story:
             return None
-
-        if format == "txt":
-            return f"""Title: Story by StoryWriterAgent
-Genre: {story['genre']}
-Tone: {story['tone']}
-Language: {story['language']}
-Created: {story['created_at']}
-Prompt: {story['prompt']}
-
----
-
-{story['content']}
-"""
-        elif format == "md":
-            return f"""# Story by StoryWriterAgent
-
-**Genre:** {story['genre']}
-**Tone:** {story['tone']}
-**Language:** {story['language']}
-**Created:** {story['created_at']}
-
-> *Prompt: {story['prompt']}*
-
----
-
-{story['content']}
-"""
-        return None
+        return format_story(story, format)
+
+    # Search results are fetched from the store this many at a time
+    EXPORT_BATCH = 500
+
+    def iter_library(self, favorites_only: bool = False, genre: Optional[str] = None,
+                     query: Optional[str] = None) -> Iterator[dict]:
+        """Lazily yield every story matching the filters.
+
+        Without a query the stories come from one consistent store
+        snapshot in insertion order; with one, in search rank order. The
+        iterator may be advanced from any thread. On SQLite the snapshot
+        holds a read transaction until the iterator finishes or is closed,
+        and the WAL cannot be checkpointed meanwhile.
+        """
+        def wanted(story):
+            return ((not favorites_only or story.get('favorite'))
+                    and (not genre or story['genre'].lower() == genre.lower()))
+
+        if query:
+            self._sync()
+            index = self.index
+            with self._index_lock, INDEX_DURATION.time(op="search"):
+                ids = [story_id for story_id, _ in index.search(query)]
+            for start in range(0, len(ids), self.EXPORT_BATCH):
+                for story in self.store.get_many(ids[start:start + self.EXPORT_BATCH]):
+                    if wanted(story):
+                        yield story
+            return
+        with self.store.snapshot() as (_, stories):
+            for story in stories:
+                if wanted(story):
+                    yield story
+
+    def export_library(self, format: str = "zip", favorites_only: bool = False,
+                       genre: Optional[str] = None, query: Optional[str] = None) -> Iterator[bytes]:
+        """Stream matching stories as a ZIP, NDJSON or markdown bundle (see story_export)"""
+        return export_library(self.iter_library(favorites_only, genre, query), format)
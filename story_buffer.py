@@ -0,0 +1,48 @@
+"""
+Chunk buffer for streamed stories
+"""
+from typing import List
+
+
+class StoryBuffer:
+    """Collects streamed chunks without re-copying the text on every append.
+
+    Chunks are kept in a list and joined only when the text is read, so
+    building a story is linear in its length rather than quadratic. Words
+    are counted as chunks arrive; a word split across two chunks is
+    counted once, and the total matches ``len(text.split())``.
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._length = 0
+        self._words = 0
+        self._in_word = False
+
+    def append(self, chunk: str):
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        self._length += len(chunk)
+        words = len(chunk.split())
+        if words and self._in_word and not chunk[0].isspace():
+            # The first word continues the one the previous chunk ended with
+            words -= 1
+        self._words += words
+        self._in_word = not chunk[-1].isspace()
+
+    def text(self) -> str:
+        if len(self._parts) > 1:
+            # Keep the joined text so repeated reads stay cheap
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    @property
+    def word_count(self) -> int:
+        return self._words
+
+    def __len__(self):
+        return self._length
+
+    def __str__(self):
+        return self.text()
@@ -0,0 +1,172 @@
+"""
+Story export formats, for single stories and streamed library bundles
+"""
+import json
+import struct
+import tempfile
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Tuple
+
+# Formats for a whole-library export
+LIBRARY_FORMATS = ("zip", "ndjson", "md")
+MEDIA_TYPES = {
+    "zip": "application/zip",
+    "ndjson": "application/x-ndjson",
+    "md": "text/markdown; charset=utf-8",
+}
+# Library exports are handed out in pieces of about this many bytes
+CHUNK_BYTES = 64 * 1024
+
+# ZIP header fields: deflate compression, UTF-8 file names, and the value
+# that moves an offset or size into a ZIP64 extra field
+_DEFLATED = 8
+_UTF8_FLAG = 0x0800
+_ZIP64_LIMIT = 0xFFFFFFFF
+
+
+def format_story(story: dict, format: str = "txt") -> Optional[str]:
+    """One story as plain text or markdown, or None for an unknown format"""
+    if format == "txt":
+        return f"""Title: Story by StoryWriterAgent
+Genre: {story['genre']}
+Tone: {story['tone']}
+Language: {story['language']}
+Created: {story['created_at']}
+Prompt: {story['prompt']}
+
+---
+
+{story['content']}
+"""
+    elif format == "md":
+        return f"""# Story by StoryWriterAgent
+
+**Genre:** {story['genre']}
+**Tone:** {story['tone']}
+**Language:** {story['language']}
+**Created:** {story['created_at']}
+
+> *Prompt: {story['prompt']}*
+
+---
+
+{story['content']}
+"""
+    return None
+
+
+def _ndjson(stories: Iterable[dict]) -> Iterator[bytes]:
+    for story in stories:
+        yield (json.dumps(story, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _markdown(stories: Iterable[dict]) -> Iterator[bytes]:
+    separator = ""
+    for story in stories:
+        yield (separator + format_story(story, "md")).encode("utf-8")
+        separator = "\n---\n\n"
+
+
+def _zip_name(story: dict) -> str:
+    return f"stories/{story['created_at'][:10]}-{story['id']}.md"
+
+
+def _dos_time(story: dict) -> Tuple[int, int]:
+    """``(time, date)`` in the MS-DOS format ZIP headers use"""
+    try:
+        created = datetime.fromisoformat(story['created_at'])
+    except (KeyError, ValueError):
+        created = datetime.now()
+    # ZIP timestamps start in 1980
+    created = max(created, datetime(1980, 1, 1))
+    return ((created.hour << 11) | (created.minute << 5) | (created.second // 2),
+            ((created.year - 1980) << 9) | (created.month << 5) | created.day)
+
+
+def _zip(stories: Iterable[dict]) -> Iterator[bytes]:
+    """A ZIP archive with one markdown file per story, produced as it is written.
+
+    Each story is deflated on its own, so its sizes and CRC are known
+    before its header goes out. The central directory is collected in a
+    spooled temporary file (on disk once it outgrows 1 MB) and sent at
+    the end, so memory stays flat however many stories there are. ZIP64
+    records are added when there are more than 65535 entries or the
+    archive passes 4 GB.
+    """
+    offset = 0
+    entries = 0
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as directory:
+        for story in stories:
+            name = _zip_name(story).encode("utf-8")
+            data = format_story(story, "md").encode("utf-8")
+            deflate = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+            compressed = deflate.compress(data) + deflate.flush()
+            crc = zlib.crc32(data)
+            dos_time, dos_date = _dos_time(story)
+
+            header = struct.pack("<IHHHHHIIIHH", 0x04034B50, 20, _UTF8_FLAG, _DEFLATED,
+                                 dos_time, dos_date, crc, len(compressed), len(data), len(name), 0)
+            yield header + name
+            yield compressed
+
+            extra = b""
+            local_offset = offset
+            if offset >= _ZIP64_LIMIT:
+                extra = struct.pack("<HHQ", 0x0001, 8, offset)
+                local_offset = _ZIP64_LIMIT
+            directory.write(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, 45 if extra else 20, 45 if extra else 20,
+                _UTF8_FLAG, _DEFLATED, dos_time, dos_date, crc, len(compressed), len(data),
+                len(name), len(extra), 0, 0, 0, 0o100644 << 16, local_offset
+            ) + name + extra)
+            offset += len(header) + len(name) + len(compressed)
+            entries += 1
+
+        directory_size = directory.tell()
+        directory.seek(0)
+        while True:
+            chunk = directory.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+    end = b""
+    if entries > 0xFFFF or offset >= _ZIP64_LIMIT or directory_size >= _ZIP64_LIMIT:
+        zip64_end = offset + directory_size
+        end += struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0,
+                           entries, entries, directory_size, offset)
+        end += struct.pack("<IIQI", 0x07064B50, 0, zip64_end, 1)
+    yield end + struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, min(entries, 0xFFFF),
+                            min(entries, 0xFFFF), min(directory_size, _ZIP64_LIMIT),
+                            min(offset, _ZIP64_LIMIT), 0)
+
+
+def _buffered(chunks: Iterable[bytes], size: int = CHUNK_BYTES) -> Iterator[bytes]:
+    """Regroup small chunks into pieces of about ``size`` bytes"""
+    pending = []
+    pending_size = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= size:
+            yield b"".join(pending)
+            pending = []
+            pending_size = 0
+    if pending:
+        yield b"".join(pending)
+
+
+def export_library(stories: Iterable[dict], format: str) -> Iterator[bytes]:
+    """Stream ``stories`` as a ZIP, NDJSON or markdown bundle without building it in memory"""
+    if format == "zip":
+        chunks = _zip(stories)
+    elif format == "ndjson":
+        chunks = _ndjson(stories)
+    elif format == "md":
+        chunks = _markdown(stories)
+    else:
+        raise ValueError(f"Unknown export format '{format}'. Use zip, ndjson or md.")
+    return _buffered(chunks)
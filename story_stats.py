@@ -0,0 +1,125 @@
+"""
+Running library statistics for StoryWriterAgent
+"""
+from typing import Iterable
+
+
+class StoryStats:
+    """Library aggregates kept up to date in O(1) per create/delete/favorite.
+
+    Besides the totals and genre/tone/language histograms, stories and words
+    are counted per day and per hour of creation. Only the most recent
+    ``MAX_DAYS`` / ``MAX_HOURS`` buckets are kept.
+    """
+
+    MAX_DAYS = 90
+    MAX_HOURS = 48
+
+    def __init__(self):
+        self.total_stories = 0
+        self.total_words = 0
+        self.favorites = 0
+        self.genres = {}
+        self.tones = {}
+        self.languages = {}
+        # bucket -> [stories, words]; days are "YYYY-MM-DD", hours "YYYY-MM-DDTHH"
+        self.days = {}
+        self.hours = {}
+
+    @classmethod
+    def rebuild(cls, stories: Iterable[dict]) -> "StoryStats":
+        """Compute the aggregates from scratch"""
+        stats = cls()
+        for story in stories:
+            stats.add(story)
+        return stats
+
+    @staticmethod
+    def _count(counts: dict, key: str, delta: int):
+        value = counts.get(key, 0) + delta
+        if value > 0:
+            counts[key] = value
+        else:
+            counts.pop(key, None)
+
+    @staticmethod
+    def _bucket(buckets: dict, key: str, stories: int, words: int, keep: int):
+        bucket = buckets.get(key)
+        if bucket is None:
+            if stories < 0:
+                # The bucket already aged out
+                return
+            bucket = buckets[key] = [0, 0]
+            if len(buckets) > keep:
+                del buckets[min(buckets)]
+                if key not in buckets:
+                    return
+        bucket[0] += stories
+        bucket[1] += words
+        if bucket[0] <= 0:
+            del buckets[key]
+
+    def _apply(self, story: dict, sign: int):
+        words = story.get('word_count', 0)
+        self.total_stories += sign
+        self.total_words += sign * words
+        if story.get('favorite', False):
+            self.favorites += sign
+        self._count(self.genres, story.get('genre', 'Unknown'), sign)
+        self._count(self.tones, story.get('tone', 'Unknown'), sign)
+        self._count(self.languages, story.get('language', 'Unknown'), sign)
+
+        created_at = story.get('created_at', '')
+        self._bucket(self.days, created_at[:10], sign, sign * words, self.MAX_DAYS)
+        self._bucket(self.hours, created_at[:13], sign, sign * words, self.MAX_HOURS)
+
+    def add(self, story: dict):
+        self._apply(story, 1)
+
+    def remove(self, story: dict):
+        self._apply(story, -1)
+
+    def favorite_changed(self, favorite: bool):
+        self.favorites += 1 if favorite else -1
+
+    def to_dict(self) -> dict:
+        """Stats payload served by /stats"""
+        return {
+            "total_stories": self.total_stories,
+            "total_words": self.total_words,
+            "favorites": self.favorites,
+            "average_words": self.total_words // self.total_stories if self.total_stories > 0 else 0,
+            "genres": dict(self.genres),
+            "tones": dict(self.tones),
+            "languages": dict(self.languages),
+            "stories_per_day": {day: b[0] for day, b in sorted(self.days.items())},
+            "words_per_day": {day: b[1] for day, b in sorted(self.days.items())},
+            "stories_per_hour": {hour: b[0] for hour, b in sorted(self.hours.items())},
+            "words_per_hour": {hour: b[1] for hour, b in sorted(self.hours.items())}
+        }
+
+    def snapshot(self) -> dict:
+        """Serializable state for persisting alongside the store"""
+        return {
+            "total_stories": self.total_stories,
+            "total_words": self.total_words,
+            "favorites": self.favorites,
+            "genres": dict(self.genres),
+            "tones": dict(self.tones),
+            "languages": dict(self.languages),
+            "days": {k: list(v) for k, v in self.days.items()},
+            "hours": {k: list(v) for k, v in self.hours.items()}
+        }
+
+    @classmethod
+    def from_snapshot(cls, data: dict) -> "StoryStats":
+        stats = cls()
+        stats.total_stories = data["total_stories"]
+        stats.total_words = data["total_words"]
+        stats.favorites = data["favorites"]
+        stats.genres = dict(data["genres"])
+        stats.tones = dict(data["tones"])
+        stats.languages = dict(data["languages"])
+        stats.days = {k: list(v) for k, v in data["days"].items()}
+        stats.hours = {k: list(v) for k, v in data["hours"].items()}
+        return stats
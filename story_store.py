@@ -0,0 +1,909 @@
+"""
+Story persistence for StoryWriterAgent
+"""
+import atexit
+import bisect
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from config import Config
+
+
+def _fsync_dir(path: str):
+    """Flush a directory entry so renames inside it survive a crash"""
+    if not hasattr(os, "O_DIRECTORY"):
+        # Windows has no directory handles; os.replace is already durable there
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_json_atomic(path: str, data):
+    """Write JSON to a temp file, fsync it and rename it over the target"""
+    directory = os.path.dirname(path) or "."
+    # Per-process temp name so concurrent workers never write the same file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(directory)
+
+
+def _lock_exclusive(path: str):
+    """Take a non-blocking exclusive lock on ``path``; return the open file holding it.
+
+    Returns None where advisory locks are unavailable (Windows, read-only
+    disks). Raises RuntimeError if another process already holds the lock.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        lock_file = open(path, 'a')
+    except (IOError, PermissionError):
+        return None
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        raise RuntimeError(
+            f"The story library is already open in another process ({path} is locked). "
+            "Set STORAGE_BACKEND=sqlite to share it between workers."
+        )
+    return lock_file
+
+
+class StoryLog:
+    """Append-only JSON-lines log of story mutations on top of a snapshot.
+
+    Every create/delete/favorite change is appended as one record to
+    ``log_file`` instead of rewriting the whole library. On startup the
+    snapshot (the familiar ``stories.json`` list) is loaded and the log is
+    replayed over it. Once the log grows past ``compact_bytes`` it is rotated
+    and a fresh snapshot is written in a background thread.
+
+    Records are idempotent (favorite stores the new value, not a toggle) so
+    replaying a rotated log that already made it into a snapshot is harmless.
+
+    ``durability`` decides when records reach the disk:
+
+    - ``"sync"``: written and fsynced before ``append`` returns
+    - ``"batched"``: queued and written by a background thread with one
+      write and fsync per ``flush_interval`` seconds, or sooner once
+      ``flush_records`` are waiting (group commit). A crash can lose the
+      last interval; ``flush``/``close`` and interpreter exit write the rest.
+    - ``"memory"``: never written, like a host without a persistent disk
+    """
+
+    DURABILITY_MODES = ("sync", "batched", "memory")
+
+    def __init__(self, snapshot_file: str, log_file: str,
+                 compact_bytes: int = 1024 * 1024, fsync: bool = True,
+                 durability: str = "sync", flush_interval: float = 0.2,
+                 flush_records: int = 256):
+        if durability not in self.DURABILITY_MODES:
+            raise ValueError(f"Unknown durability '{durability}'. Use sync, batched or memory.")
+        self.snapshot_file = snapshot_file
+        self.log_file = log_file
+        self.rotated_file = f"{log_file}.old"
+        self.compact_bytes = compact_bytes
+        self.fsync = fsync
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+        self._lock = threading.Lock()
+        self._log = None
+        self._log_size = 0
+        self._compacting = None
+        # Group commit queue for "batched" durability
+        self._pending: List[str] = []
+        self._pending_records = 0
+        self._pending_lock = threading.Lock()
+        # Keeps queued data in order when flushes overlap
+        self._flush_lock = threading.Lock()
+        self._snapshot: Optional[Callable[[], List[dict]]] = None
+        self._wake = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._closing = False
+
+    def load(self) -> List[dict]:
+        """Load the snapshot and replay pending log records over it"""
+        stories = {}
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                for story in json.load(f):
+                    stories[story['id']] = story
+
+        if os.path.exists(self.rotated_file):
+            # An interrupted compaction: fold its records into a fresh snapshot
+            self._replay(self.rotated_file, stories)
+            write_json_atomic(self.snapshot_file, list(stories.values()))
+            os.remove(self.rotated_file)
+
+        if os.path.exists(self.log_file):
+            self._log_size = self._replay(self.log_file, stories)
+            if self._log_size < os.path.getsize(self.log_file):
+                # Drop a torn final record so new appends start on a clean line
+                with open(self.log_file, 'r+b') as f:
+                    f.truncate(self._log_size)
+        return list(stories.values())
+
+    @staticmethod
+    def _replay(path: str, stories: dict) -> int:
+        """Apply the records in ``path`` and return the offset of the last complete one"""
+        offset = 0
+        with open(path, 'rb') as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(raw)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    # A torn record from a crash mid-append; nothing valid follows it
+                    break
+                offset += len(raw)
+
+                op = record.get("op")
+                if op == "create":
+                    story = record["story"]
+                    stories[story['id']] = story
+                elif op == "delete":
+                    stories.pop(record["id"], None)
+                elif op == "favorite":
+                    story = stories.get(record["id"])
+                    if story is not None:
+                        story['favorite'] = record["favorite"]
+        return offset
+
+    def append(self, record: dict, snapshot: Callable[[], List[dict]]):
+        """Append one mutation record; compact in the background when the log is large.
+
+        ``snapshot`` returns the current list of stories and is only called
+        when a compaction is started.
+        """
+        self.append_many([record], snapshot)
+
+    def append_many(self, records: List[dict], snapshot: Callable[[], List[dict]]):
+        """Append several records with a single write and fsync (or queue them)"""
+        if not records or self.durability == "memory":
+            return
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        if self.durability == "batched":
+            with self._pending_lock:
+                self._pending.append(data)
+                self._pending_records += len(records)
+                self._snapshot = snapshot
+                if self._flusher is None:
+                    self._start_flusher()
+                full = self._pending_records >= self.flush_records
+            if full:
+                self._wake.set()
+            return
+        self._write(data, snapshot)
+
+    def _start_flusher(self):
+        """Start the group commit thread (pending lock held)"""
+        self._flusher = threading.Thread(target=self._flush_loop, name="story-log-flush", daemon=True)
+        self._flusher.start()
+        # The thread is a daemon, so make sure queued records survive interpreter exit
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while not self._closing:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except (IOError, PermissionError):
+                # As in sync mode: keep serving from memory if the disk is unavailable
+                pass
+
+    def flush(self):
+        """Write every queued record now with one write and fsync"""
+        with self._flush_lock:
+            with self._pending_lock:
+                data = "".join(self._pending)
+                snapshot = self._snapshot
+                self._pending = []
+                self._pending_records = 0
+            if data:
+                self._write(data, snapshot)
+
+    def _write(self, data: str, snapshot: Callable[[], List[dict]]):
+        with self._lock:
+            if self._log is None:
+                os.makedirs(os.path.dirname(self.log_file) or ".", exist_ok=True)
+                self._log = open(self.log_file, 'a', encoding='utf-8', newline='')
+            self._log.write(data)
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            self._log_size += len(data.encode('utf-8'))
+
+            if self._log_size >= self.compact_bytes and self._compacting is None:
+                self._start_compaction(snapshot)
+
+    def _start_compaction(self, snapshot: Callable[[], List[dict]]):
+        """Rotate the log and write a new snapshot off the request path (lock held)"""
+        if os.path.exists(self.rotated_file):
+            # A failed compaction left its records behind; retry after a restart
+            return
+        stories = [dict(s) for s in snapshot()]
+        self._log.close()
+        self._log = None
+        os.replace(self.log_file, self.rotated_file)
+        self._log_size = 0
+
+        self._compacting = threading.Thread(
+            target=self._compact, args=(stories,), name="story-log-compaction", daemon=True
+        )
+        self._compacting.start()
+
+    def _compact(self, stories: List[dict]):
+        try:
+            write_json_atomic(self.snapshot_file, stories)
+            os.remove(self.rotated_file)
+        except OSError:
+            # Leave the rotated log in place; it is replayed on the next start
+            pass
+        finally:
+            with self._lock:
+                self._compacting = None
+
+    def wait_for_compaction(self, timeout: Optional[float] = None):
+        """Block until a running background compaction has finished"""
+        thread = self._compacting
+        if thread is not None:
+            thread.join(timeout)
+
+    def close(self):
+        """Write queued records and close the log file handle"""
+        self._closing = True
+        if self._flusher is not None:
+            self._wake.set()
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+        self.wait_for_compaction()
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+
+class StoryStore:
+    """Interface shared by the story storage backends.
+
+    Listing methods return stories newest first.
+    """
+
+    def add(self, story: dict):
+        raise NotImplementedError
+
+    def add_many(self, stories: List[dict]):
+        """Add several stories in one write where the backend supports it"""
+        for story in stories:
+            self.add(story)
+
+    def get(self, story_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def get_many(self, story_ids: List[str]) -> List[dict]:
+        """Fetch several stories, keeping the order of ``story_ids``"""
+        stories = (self.get(story_id) for story_id in story_ids)
+        return [story for story in stories if story is not None]
+
+    def delete(self, story_id: str) -> bool:
+        raise NotImplementedError
+
+    def set_favorite(self, story_id: str, favorite: bool) -> Optional[dict]:
+        raise NotImplementedError
+
+    def toggle_favorite(self, story_id: str) -> Optional[dict]:
+        """Flip a story's favorite flag and return the updated story"""
+        story = self.get(story_id)
+        if story is None:
+            return None
+        return self.set_favorite(story_id, not story.get('favorite', False))
+
+    def list_stories(self, favorites_only: bool = False) -> List[dict]:
+        raise NotImplementedError
+
+    def list_page(self, limit: int, before: Optional[tuple] = None,
+                  favorites_only: bool = False) -> List[dict]:
+        """Up to ``limit`` stories older than the ``(created_at, id)`` key ``before``"""
+        raise NotImplementedError
+
+    def iter_stories(self) -> Iterator[dict]:
+        """Iterate over every story without building a full list"""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    # True when other processes may write to the same store; their writes
+    # are then read back through changes_since()
+    shared = False
+
+    @property
+    def seq(self) -> Optional[int]:
+        """Persistent mutation counter, or None if the backend keeps none"""
+        return None
+
+    @contextmanager
+    def snapshot(self) -> Iterator[Tuple[Optional[int], Iterator[dict]]]:
+        """``(seq, stories)`` read consistently, for building derived data"""
+        yield self.seq, self.iter_stories()
+
+    def changes_since(self, seq: int) -> Optional[List[tuple]]:
+        """Mutations after ``seq`` as ``(seq, op, payload)``, oldest first.
+
+        ``op`` is "create" or "delete" (payload: the story) or "favorite"
+        (payload: the new flag). None means the feed no longer reaches back
+        that far and derived data has to be rebuilt.
+        """
+        return []
+
+    def load_meta(self, key: str) -> Optional[dict]:
+        """Load derived data (such as running stats) saved with the store"""
+        return None
+
+    def save_meta(self, key: str, value: dict):
+        pass
+
+    def flush(self):
+        """Make every accepted write durable (a no-op unless writes are batched)"""
+        pass
+
+    def close(self):
+        pass
+
+
+class _Timeline:
+    """Sorted ``(created_at, id)`` keys with lazy removal.
+
+    Adding appends in the usual case, since new stories are the newest.
+    Removing only counts the key as stale: readers skip keys that no
+    longer resolve to a live story, and the list is rebuilt once more
+    than half of it is stale, so removals are amortized O(1).
+    """
+
+    def __init__(self):
+        self.keys = []
+        self._listed = set()
+        self._stale = 0
+
+    def add(self, key: tuple):
+        if key in self._listed:
+            # A stale entry comes back to life
+            self._stale -= 1
+        else:
+            self._listed.add(key)
+            bisect.insort(self.keys, key)
+
+    def discard(self, key: tuple, live: Callable[[tuple], Optional[dict]]):
+        self._stale += 1
+        if self._stale > 64 and self._stale * 2 > len(self.keys):
+            # Readers keep walking the old list; it is never changed again
+            self.keys = [k for k in self.keys if live(k) is not None]
+            self._listed = set(self.keys)
+            self._stale = 0
+
+    def page(self, limit: int, before: Optional[tuple],
+             live: Callable[[tuple], Optional[dict]]) -> List[dict]:
+        """Up to ``limit`` live stories older than ``before``, newest first"""
+        keys = self.keys
+        end = len(keys) if before is None else bisect.bisect_left(keys, tuple(before))
+        stories = []
+        while end > 0 and len(stories) < limit:
+            # Copy a slice (atomic) and re-find its start, since writers may
+            # insert keys while this walks backwards
+            chunk = keys[max(0, end - max(limit - len(stories), 16)):end]
+            for key in reversed(chunk):
+                story = live(key)
+                if story is not None:
+                    stories.append(story)
+                    if len(stories) == limit:
+                        break
+            end = bisect.bisect_left(keys, chunk[0])
+        return stories
+
+
+class MemoryStore(StoryStore):
+    """Keeps every story in memory; nothing survives a restart.
+
+    Stories live in a dict keyed by id, so lookups and mutations are O(1).
+    Chronological order is kept in two timelines of ``(created_at, id)``
+    keys (all stories and favorites): new stories append at the end,
+    deletes and unfavorites leave stale keys behind for readers to skip,
+    and keyset pages are found by bisection instead of sorting.
+
+    Writers must be serialized by the caller (StoryAgent holds a lock).
+    Readers need no lock: story records are replaced rather than changed
+    in place, and readers copy slices of a timeline (a single atomic
+    operation) before resolving ids, skipping any deleted since.
+    """
+
+    def __init__(self, stories: Optional[List[dict]] = None):
+        self._stories = {}
+        self._order = _Timeline()
+        self._favorites = _Timeline()
+        for story in sorted(stories or [], key=lambda x: (x['created_at'], x['id'])):
+            self._insert(story)
+
+    @staticmethod
+    def _key(story: dict) -> tuple:
+        return (story['created_at'], story['id'])
+
+    def _live(self, key: tuple) -> Optional[dict]:
+        story = self._stories.get(key[1])
+        return story if story is not None and self._key(story) == key else None
+
+    def _live_favorite(self, key: tuple) -> Optional[dict]:
+        story = self._live(key)
+        return story if story is not None and story.get('favorite', False) else None
+
+    def _insert(self, story: dict):
+        if story['id'] in self._stories:
+            self._remove(story['id'])
+        self._stories[story['id']] = story
+        self._order.add(self._key(story))
+        if story.get('favorite', False):
+            self._favorites.add(self._key(story))
+
+    def _remove(self, story_id: str) -> Optional[dict]:
+        story = self._stories.pop(story_id, None)
+        if story is not None:
+            self._order.discard(self._key(story), self._live)
+            if story.get('favorite', False):
+                self._favorites.discard(self._key(story), self._live_favorite)
+        return story
+
+    def add(self, story: dict):
+        self._insert(story)
+
+    def get(self, story_id: str) -> Optional[dict]:
+        return self._stories.get(story_id)
+
+    def delete(self, story_id: str) -> bool:
+        return self._remove(story_id) is not None
+
+    def set_favorite(self, story_id: str, favorite: bool) -> Optional[dict]:
+        story = self._stories.get(story_id)
+        if story is not None and story.get('favorite', False) != favorite:
+            story = self._stories[story_id] = dict(story, favorite=favorite)
+            if favorite:
+                self._favorites.add(self._key(story))
+            else:
+                self._favorites.discard(self._key(story), self._live_favorite)
+        return story
+
+    def list_stories(self, favorites_only: bool = False) -> List[dict]:
+        timeline, live = ((self._favorites, self._live_favorite) if favorites_only
+                          else (self._order, self._live))
+        stories = (live(key) for key in reversed(timeline.keys[:]))
+        return [story for story in stories if story is not None]
+
+    def list_page(self, limit: int, before: Optional[tuple] = None,
+                  favorites_only: bool = False) -> List[dict]:
+        if favorites_only:
+            return self._favorites.page(limit, before, self._live_favorite)
+        return self._order.page(limit, before, self._live)
+
+    def iter_stories(self) -> Iterator[dict]:
+        return iter(list(self._stories.values()))
+
+    def count(self) -> int:
+        return len(self._stories)
+
+
+class JsonFileStore(MemoryStore):
+    """In-memory library persisted through a :class:`StoryLog`"""
+
+    def __init__(self, snapshot_file: str, log_file: str,
+                 compact_bytes: int = 1024 * 1024, durability: str = "sync",
+                 flush_interval: float = 0.2, flush_records: int = 256):
+        # The library lives in this process's memory, so a second process
+        # appending to the same log would silently diverge from it
+        self._lock_file = _lock_exclusive(f"{log_file}.lock")
+        self.log = StoryLog(snapshot_file, log_file, compact_bytes=compact_bytes,
+                            durability=durability, flush_interval=flush_interval,
+                            flush_records=flush_records)
+        super().__init__(self._load())
+
+    def _load(self) -> List[dict]:
+        # For cloud deployment, fall back to in-memory storage
+        # Stories won't persist between restarts on free tier
+        try:
+            return self.log.load()
+        except (json.JSONDecodeError, IOError, PermissionError):
+            return []
+
+    def _append(self, *records: dict):
+        try:
+            self.log.append_many(list(records), lambda: list(self._stories.values()))
+        except (IOError, PermissionError):
+            # On cloud platforms, file storage may not be available
+            pass
+
+    def add(self, story: dict):
+        super().add(story)
+        self._append({"op": "create", "story": story})
+
+    def add_many(self, stories: List[dict]):
+        for story in stories:
+            self._insert(story)
+        self._append(*({"op": "create", "story": story} for story in stories))
+
+    def delete(self, story_id: str) -> bool:
+        if not super().delete(story_id):
+            return False
+        self._append({"op": "delete", "id": story_id})
+        return True
+
+    def set_favorite(self, story_id: str, favorite: bool) -> Optional[dict]:
+        story = super().set_favorite(story_id, favorite)
+        if story is not None:
+            self._append({"op": "favorite", "id": story_id, "favorite": favorite})
+        return story
+
+    def flush(self):
+        try:
+            self.log.flush()
+        except (IOError, PermissionError):
+            pass
+
+    def close(self):
+        try:
+            self.log.close()
+        except (IOError, PermissionError):
+            pass
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+class SQLiteStore(StoryStore):
+    """Stories in a SQLite database, queried through indexes instead of held in memory.
+
+    The database runs in WAL mode so several worker processes can share
+    it: readers never block the writer and writers queue on the database
+    lock for up to ``busy_timeout`` seconds. Every mutation also appends a
+    row to the ``changes`` table in the same transaction, which lets each
+    process replay the others' writes into its own search index and stats.
+
+    Writes share one connection and queue on ``_lock``. Reads take a
+    connection from a small pool instead, so they neither wait for a
+    writer stuck in the busy timeout nor for each other.
+    """
+
+    shared = True
+
+    COLUMNS = ("id", "prompt", "content", "genre", "tone", "length", "language",
+               "created_at", "favorite", "word_count", "incomplete")
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS stories (
+        id TEXT PRIMARY KEY,
+        prompt TEXT NOT NULL,
+        content TEXT NOT NULL,
+        genre TEXT NOT NULL,
+        tone TEXT NOT NULL,
+        length TEXT NOT NULL,
+        language TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        favorite INTEGER NOT NULL DEFAULT 0,
+        word_count INTEGER NOT NULL DEFAULT 0,
+        incomplete INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_stories_created_at ON stories (created_at, id);
+    CREATE INDEX IF NOT EXISTS idx_stories_favorite ON stories (favorite, created_at, id);
+    CREATE INDEX IF NOT EXISTS idx_stories_genre ON stories (genre);
+    CREATE INDEX IF NOT EXISTS idx_stories_tone ON stories (tone);
+    CREATE INDEX IF NOT EXISTS idx_stories_language ON stories (language);
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    INSERT OR IGNORE INTO meta (key, value) VALUES ('seq', '0');
+    CREATE TABLE IF NOT EXISTS changes (
+        seq INTEGER PRIMARY KEY,
+        op TEXT NOT NULL,
+        payload TEXT NOT NULL
+    );
+    """
+
+    # PRAGMA synchronous per durability mode. In WAL mode NORMAL skips the
+    # fsync on commit and syncs at checkpoints instead, SQLite's own group
+    # commit; a power loss can drop the latest commits but never corrupts.
+    # There is no "memory" mode: a database file is always written.
+    SYNCHRONOUS = {"sync": "FULL", "batched": "NORMAL"}
+
+    def __init__(self, db_file: str, busy_timeout: float = 30, change_feed_size: int = 10000,
+                 durability: str = "sync"):
+        if durability == "memory":
+            raise ValueError("The sqlite store always writes its database; "
+                             "use STORAGE_BACKEND=memory to keep stories in memory only.")
+        if durability not in self.SYNCHRONOUS:
+            raise ValueError(f"Unknown durability '{durability}'. Use sync or batched.")
+        directory = os.path.dirname(db_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_file = db_file
+        self.busy_timeout = busy_timeout
+        self.change_feed_size = change_feed_size
+        self._lock = threading.Lock()
+        # Idle read connections; list.append and list.pop are atomic
+        self._readers = []
+        self._conn = self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={self.SYNCHRONOUS[durability]}")
+        with self._lock, self._conn:
+            self._conn.executescript(self.SCHEMA)
+            self._migrate()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections move between threads, but only one uses each at a time
+        conn = sqlite3.connect(self.db_file, timeout=self.busy_timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _reading(self) -> Iterator[sqlite3.Connection]:
+        """A read connection from the pool, opened if none is idle"""
+        try:
+            conn = self._readers.pop()
+        except IndexError:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            self._readers.append(conn)
+
+    def _migrate(self):
+        """Add columns introduced after a database was created"""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(stories)")}
+        if "incomplete" not in columns:
+            self._conn.execute("ALTER TABLE stories ADD COLUMN incomplete INTEGER NOT NULL DEFAULT 0")
+
+    @classmethod
+    def _to_row(cls, story: dict) -> tuple:
+        row = dict(story, favorite=int(story.get('favorite', False)),
+                   word_count=story.get('word_count', 0),
+                   incomplete=int(story.get('incomplete', False)))
+        return tuple(row.get(column, "") for column in cls.COLUMNS)
+
+    @staticmethod
+    def _to_story(row: sqlite3.Row) -> dict:
+        story = dict(row)
+        story['favorite'] = bool(story['favorite'])
+        # Only partial stories carry the flag, as in the JSON store
+        if story.pop('incomplete', 0):
+            story['incomplete'] = True
+        return story
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that takes the database write lock up front.
+
+        Starting with BEGIN IMMEDIATE means a read-then-write inside the
+        transaction cannot be invalidated by another process's commit.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+
+    def _query(self, sql: str, params: tuple = ()) -> List[dict]:
+        with self._reading() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [self._to_story(row) for row in rows]
+
+    def add(self, story: dict):
+        self.add_many([story])
+
+    def add_many(self, stories: List[dict]):
+        """Insert several stories in one transaction"""
+        placeholders = ", ".join("?" for _ in self.COLUMNS)
+        sql = f"INSERT OR REPLACE INTO stories ({', '.join(self.COLUMNS)}) VALUES ({placeholders})"
+        with self._transaction():
+            self._conn.executemany(sql, [self._to_row(s) for s in stories])
+            self._record_changes([("create", story) for story in stories])
+
+    def get(self, story_id: str) -> Optional[dict]:
+        stories = self._query("SELECT * FROM stories WHERE id = ?", (story_id,))
+        return stories[0] if stories else None
+
+    def delete(self, story_id: str) -> bool:
+        with self._transaction():
+            row = self._conn.execute("SELECT * FROM stories WHERE id = ?", (story_id,)).fetchone()
+            if row is None:
+                return False
+            self._conn.execute("DELETE FROM stories WHERE id = ?", (story_id,))
+            self._record_changes([("delete", self._to_story(row))])
+        return True
+
+    def _update_favorite(self, story_id: str, value_sql: str, params: tuple) -> Optional[dict]:
+        with self._transaction():
+            row = self._conn.execute("SELECT favorite FROM stories WHERE id = ?", (story_id,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(f"UPDATE stories SET favorite = {value_sql} WHERE id = ?",
+                               params + (story_id,))
+            story = self._to_story(
+                self._conn.execute("SELECT * FROM stories WHERE id = ?", (story_id,)).fetchone()
+            )
+            if story['favorite'] != bool(row["favorite"]):
+                self._record_changes([("favorite", story['favorite'])])
+        return story
+
+    def set_favorite(self, story_id: str, favorite: bool) -> Optional[dict]:
+        return self._update_favorite(story_id, "?", (int(favorite),))
+
+    def toggle_favorite(self, story_id: str) -> Optional[dict]:
+        """Flip the flag in one transaction so concurrent toggles are never lost"""
+        return self._update_favorite(story_id, "1 - favorite", ())
+
+    def list_stories(self, favorites_only: bool = False) -> List[dict]:
+        if favorites_only:
+            return self._query(
+                "SELECT * FROM stories WHERE favorite = 1 ORDER BY created_at DESC, id DESC"
+            )
+        return self._query("SELECT * FROM stories ORDER BY created_at DESC, id DESC")
+
+    def get_many(self, story_ids: List[str]) -> List[dict]:
+        found = {}
+        for start in range(0, len(story_ids), 500):
+            batch = story_ids[start:start + 500]
+            placeholders = ", ".join("?" for _ in batch)
+            for story in self._query(f"SELECT * FROM stories WHERE id IN ({placeholders})", tuple(batch)):
+                found[story['id']] = story
+        return [found[story_id] for story_id in story_ids if story_id in found]
+
+    def list_page(self, limit: int, before: Optional[tuple] = None,
+                  favorites_only: bool = False) -> List[dict]:
+        conditions = []
+        params = []
+        if favorites_only:
+            conditions.append("favorite = 1")
+        if before is not None:
+            conditions.append("(created_at, id) < (?, ?)")
+            params.extend(before)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        params.append(limit)
+        return self._query(
+            f"SELECT * FROM stories {where}ORDER BY created_at DESC, id DESC LIMIT ?", tuple(params)
+        )
+
+    def iter_stories(self, batch_size: int = 500) -> Iterator[dict]:
+        last_rowid = 0
+        while True:
+            with self._reading() as conn:
+                rows = conn.execute(
+                    "SELECT rowid, * FROM stories WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_rowid = rows[-1]["rowid"]
+            for row in rows:
+                story = self._to_story(row)
+                del story["rowid"]
+                yield story
+
+    def count(self) -> int:
+        with self._reading() as conn:
+            return conn.execute("SELECT COUNT(*) FROM stories").fetchone()[0]
+
+    def _current_seq(self, conn: sqlite3.Connection = None) -> int:
+        conn = conn or self._conn
+        return int(conn.execute("SELECT value FROM meta WHERE key = 'seq'").fetchone()[0])
+
+    def _record_changes(self, changes: List[tuple]):
+        """Count mutations and add them to the change feed (inside their transaction)"""
+        if not changes:
+            return
+        first = self._current_seq() + 1
+        self._conn.execute("UPDATE meta SET value = ? WHERE key = 'seq'", (str(first + len(changes) - 1),))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO changes (seq, op, payload) VALUES (?, ?, ?)",
+            [(seq, op, json.dumps(payload, ensure_ascii=False))
+             for seq, (op, payload) in enumerate(changes, first)]
+        )
+        last = first + len(changes) - 1
+        if last // 100 != (first - 1) // 100:
+            # Trim the feed now and then; a reader further behind rebuilds instead
+            self._conn.execute("DELETE FROM changes WHERE seq <= ?", (last - self.change_feed_size,))
+
+    @property
+    def seq(self) -> Optional[int]:
+        with self._reading() as conn:
+            return self._current_seq(conn)
+
+    @contextmanager
+    def snapshot(self) -> Iterator[Tuple[Optional[int], Iterator[dict]]]:
+        """Read ``seq`` and every story in one transaction on a private connection.
+
+        The stories are read lazily, and the caller may advance the iterator
+        from different threads (Starlette runs each ``next()`` of a streamed
+        response in its threadpool); it is only ever used by one at a time.
+        The read transaction stays open until the iterator is done, so a
+        slow consumer such as a long export download keeps SQLite from
+        checkpointing the WAL, which grows until the snapshot is closed.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN")
+            seq = self._current_seq(conn)
+            rows = conn.execute("SELECT * FROM stories ORDER BY rowid")
+            yield seq, (self._to_story(row) for row in rows)
+        finally:
+            conn.close()
+
+    def changes_since(self, seq: int) -> Optional[List[tuple]]:
+        with self._reading() as conn:
+            current = self._current_seq(conn)
+            if current <= seq:
+                return []
+            rows = conn.execute(
+                "SELECT seq, op, payload FROM changes WHERE seq > ? ORDER BY seq", (seq,)
+            ).fetchall()
+        if not rows or rows[0]["seq"] != seq + 1:
+            return None
+        return [(row["seq"], row["op"], json.loads(row["payload"])) for row in rows]
+
+    def load_meta(self, key: str) -> Optional[dict]:
+        with self._reading() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_meta(self, key: str, value: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (key, json.dumps(value, ensure_ascii=False))
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        while self._readers:
+            self._readers.pop().close()
+
+
+def create_store(backend: Optional[str] = None) -> StoryStore:
+    """Build the storage backend selected by ``Config.STORAGE_BACKEND``"""
+    backend = (backend or Config.STORAGE_BACKEND).lower()
+    if backend == "memory":
+        return MemoryStore()
+    durability = Config.STORAGE_DURABILITY.lower()
+    if backend == "json":
+        return JsonFileStore(Config.STORIES_FILE, Config.STORIES_LOG_FILE,
+                             compact_bytes=Config.LOG_COMPACT_BYTES, durability=durability,
+                             flush_interval=Config.STORAGE_FLUSH_INTERVAL,
+                             flush_records=Config.STORAGE_FLUSH_RECORDS)
+    if backend == "sqlite":
+        is_new = not os.path.exists(Config.SQLITE_FILE)
+        store = SQLiteStore(Config.SQLITE_FILE, busy_timeout=Config.SQLITE_BUSY_TIMEOUT,
+                            change_feed_size=Config.CHANGE_FEED_SIZE, durability=durability)
+        if is_new and (os.path.exists(Config.STORIES_FILE) or os.path.exists(Config.STORIES_LOG_FILE)):
+            # First start on SQLite: carry over the existing JSON library
+            log = StoryLog(Config.STORIES_FILE, Config.STORIES_LOG_FILE)
+            store.add_many(log.load())
+        return store
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}'. Use memory, json or sqlite.")
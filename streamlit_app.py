@@ -4,8 +4,11 @@ Day 36 of #100DaysOfAI-Agents
 Author: Muhammad Sami
 """
 import streamlit as st
-from openai import OpenAI
-import json
+from config import Config, EXAMPLE_PROMPTS
+from http_client import get_client
+from story_buffer import StoryBuffer
+from render_throttle import ThrottledRenderer
+import atexit
 import os
 from datetime import datetime
 
@@ -48,6 +51,14 @@ st.markdown("""
         border: 1px solid #2a2a4a;
     }
 
+    /* Paragraphs shown while a story streams in, before the final render */
+    .story-part {
+        font-family: 'Merriweather', serif;
+        font-size: 1.1rem;
+        line-height: 2;
+        padding: 0 2rem;
+    }
+
     .story-content p:first-of-type::first-letter {
         font-size: 3rem;
         float: left;
@@ -109,82 +120,109 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Configuration
-GENRES = ["Fantasy", "Sci-Fi", "Mystery", "Romance", "Horror", "Children's", "Success", "Struggle", "Adventure", "Thriller", "Comedy", "Drama"]
-TONES = ["Serious", "Funny", "Inspirational", "Dramatic"]
-LENGTHS = {
-    "Short (100-300 words)": (100, 300),
-    "Medium (300-600 words)": (300, 600),
-    "Long (600+ words)": (600, 1000)
-}
-LANGUAGES = ["English", "Urdu", "Arabic", "Spanish", "French", "German"]
-
-EXAMPLE_PROMPTS = [
-    "A dragon who wanted to become a chef",
-    "A robot learning to love in a world without emotions",
-    "A detective solving crimes in a haunted mansion",
-    "Two strangers meeting on a train to nowhere",
-    "A child discovering a magical door in their closet",
-    "An astronaut finding signs of ancient civilization on Mars",
-    "A struggling artist who finds success through failure",
-    "An entrepreneur's journey from nothing to everything"
-]
-
-# Initialize session state
-if 'stories' not in st.session_state:
-    st.session_state.stories = []
+GENRES = Config.GENRES
+TONES = Config.TONES
+LENGTHS = Config.LENGTHS
+LANGUAGES = Config.LANGUAGES
+
+# The app shares its library with the FastAPI server, which only SQLite
+# allows: the json store is locked to one process and memory to none
+if Config.STORAGE_BACKEND.lower() != "sqlite":
+    st.error(f"STORAGE_BACKEND is '{Config.STORAGE_BACKEND}'. The Streamlit app shares the "
+             "library with the web server and needs STORAGE_BACKEND=sqlite (the default).")
+    st.stop()
+
+@st.cache_resource
+def get_agent():
+    """One StoryAgent per server process, shared by every session.
+
+    Sessions share its store, search index, stats and OpenAI connection
+    pool, so the library survives restarts and reruns are cheap.
+    """
+    from story_agent import StoryAgent
+    agent = StoryAgent(require_api_key=False).open()
+    # Flush batched writes and save stats when the server stops
+    atexit.register(agent.close)
+    return agent
+
+# Initialize session state; the stories live in the shared store and each
+# session only remembers the ids it generated
+if 'story_ids' not in st.session_state:
+    st.session_state.story_ids = []
 if 'current_story' not in st.session_state:
     st.session_state.current_story = None
+if 'library_limit' not in st.session_state:
+    st.session_state.library_limit = Config.PAGE_SIZE
 
 def get_openai_client():
     """Get OpenAI client with API key"""
-    api_key = st.session_state.get('api_key') or os.getenv('OPENAI_API_KEY')
+    api_key = st.session_state.get('api_key') or Config.OPENAI_API_KEY
     if not api_key:
         return None
-    return OpenAI(api_key=api_key)
+    # Shared client: reruns reuse the same pooled connections
+    return get_client(api_key)
 
 def generate_story(prompt, genre, tone, length, language):
-    """Generate a story using OpenAI"""
+    """Stream a story from the shared agent, which saves it when done"""
     client = get_openai_client()
     if not client:
         st.error("Please enter your OpenAI API key in the sidebar")
         return None
+    return get_agent().generate_story_stream(prompt, genre, tone, length, language, client=client)
+
+def _collect(fetch_page, wanted, limit):
+    """Page through ``fetch_page(cursor)`` until ``limit`` stories pass ``wanted``"""
+    stories, cursor = [], None
+    while True:
+        page = fetch_page(cursor)
+        for story in page["items"]:
+            if not wanted(story):
+                continue
+            if len(stories) == limit:
+                return stories, True
+            stories.append(story)
+        cursor = page["next_cursor"]
+        if not cursor:
+            return stories, False
+
+def load_library(scope, search, genre, favorites_only, limit):
+    """Stories for the library tab and whether more can be loaded.
+
+    Search goes through the agent's index and listing through store
+    pages; filters are applied page by page until ``limit`` stories
+    match, so a rerun stops as soon as it has enough.
+    """
+    agent = get_agent()
+    session_ids = set(st.session_state.story_ids)
+
+    def wanted(story):
+        return ((scope != "This session" or story['id'] in session_ids)
+                and (genre == "All" or story['genre'] == genre)
+                and (not favorites_only or story.get('favorite')))
 
-    min_words, max_words = LENGTHS[length]
-
-    system_prompt = f"""You are a creative story writer. Write an engaging {genre.lower()} story with a {tone.lower()} tone.
-
-Guidelines:
-- Write the story in {language}
-- Target length: {min_words}-{max_words} words
-- Create vivid characters and settings
-- Include a clear beginning, middle, and end
-- Make the story engaging and memorable
-- Match the tone consistently throughout
-- Use markdown formatting for better readability
-
-User's story idea: {prompt}
-
-Write the story now:"""
-
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a creative story writer."},
-                {"role": "user", "content": system_prompt}
-            ],
-            temperature=0.8,
-            max_tokens=2000,
-            stream=True
-        )
-        return response
-    except Exception as e:
-        st.error(f"Error generating story: {str(e)}")
-        return None
-
-def save_story(story_data):
-    """Save story to session state"""
-    st.session_state.stories.insert(0, story_data)
+    if search:
+        return _collect(lambda cursor: agent.search_stories_page(
+            search, limit=Config.MAX_PAGE_SIZE, cursor=cursor), wanted, limit)
+    if scope == "This session":
+        stories = [agent.get_story(story_id) for story_id in st.session_state.story_ids]
+        stories = [s for s in stories if s and wanted(s)]
+        return stories[:limit], len(stories) > limit
+    return _collect(lambda cursor: agent.get_stories_page(
+        limit=Config.MAX_PAGE_SIZE, cursor=cursor, favorites_only=favorites_only), wanted, limit)
+
+def draw_story(element, text, final):
+    """Write story text into a Streamlit element"""
+    css_class = "story-content" if final else "story-part"
+    element.markdown(f"""
+    <div class="{css_class}">
+        {text}
+    </div>
+    """, unsafe_allow_html=True)
+
+def remember_story(story):
+    """Add a generated story to this session's partition"""
+    st.session_state.story_ids.insert(0, story['id'])
+    st.session_state.current_story = story
 
 # Header
 st.markdown("""
@@ -212,19 +250,17 @@ with st.sidebar:
 
     st.markdown("---")
 
-    # Stats
+    # Stats, kept up to date by the agent on every write
     st.markdown("### 📊 Statistics")
-    total_stories = len(st.session_state.stories)
-    total_words = sum(s.get('word_count', 0) for s in st.session_state.stories)
-    favorites = sum(1 for s in st.session_state.stories if s.get('favorite', False))
+    stats = get_agent().get_stats()
 
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("Stories", total_stories)
-        st.metric("Favorites", favorites)
+        st.metric("Stories", stats['total_stories'])
+        st.metric("Favorites", stats['favorites'])
     with col2:
-        st.metric("Words", total_words)
-        st.metric("Avg Words", total_words // total_stories if total_stories > 0 else 0)
+        st.metric("Words", stats['total_words'])
+        st.metric("Avg Words", stats['average_words'])
 
     st.markdown("---")
 
@@ -260,47 +296,40 @@ with tab1:
         st.markdown("### ⚙️ Options")
         genre = st.selectbox("Genre", GENRES)
         tone = st.selectbox("Tone", TONES)
-        length = st.selectbox("Length", list(LENGTHS.keys()))
+        length = st.selectbox("Length", list(LENGTHS.keys()), index=1,
+                              format_func=lambda key: LENGTHS[key]["label"])
         language = st.selectbox("Language", LANGUAGES)
 
     # Generate button
     if st.button("✨ Generate Story", type="primary", use_container_width=True):
         if not prompt:
             st.warning("Please enter a story idea")
-        elif not st.session_state.get('api_key') and not os.getenv('OPENAI_API_KEY'):
+        elif not st.session_state.get('api_key') and not Config.OPENAI_API_KEY:
             st.warning("Please enter your OpenAI API key in the sidebar")
         else:
             with st.spinner("🪄 Generating your story..."):
                 story_placeholder = st.empty()
-                full_content = ""
-
-                response = generate_story(prompt, genre, tone, length, language)
-
-                if response:
-                    for chunk in response:
-                        if chunk.choices[0].delta.content:
-                            full_content += chunk.choices[0].delta.content
-                            story_placeholder.markdown(f"""
-                            <div class="story-content">
-                                {full_content}
-                            </div>
-                            """, unsafe_allow_html=True)
-
-                    # Save story
-                    story_data = {
-                        "id": datetime.now().isoformat(),
-                        "prompt": prompt,
-                        "content": full_content,
-                        "genre": genre,
-                        "tone": tone,
-                        "length": length,
-                        "language": language,
-                        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                        "word_count": len(full_content.split()),
-                        "favorite": False
-                    }
-                    save_story(story_data)
-                    st.session_state.current_story = story_data
+                buffer = StoryBuffer()
+                renderer = ThrottledRenderer(story_placeholder, draw_story, fps=Config.STREAMLIT_RENDER_FPS)
+
+                stream = generate_story(prompt, genre, tone, length, language)
+
+                story_data = None
+                if stream:
+                    try:
+                        while True:
+                            buffer.append(next(stream))
+                            renderer.update(buffer)
+                    except StopIteration as done:
+                        # The agent has saved the story and returns it
+                        story_data = done.value
+                    except Exception as e:
+                        st.error(f"Error generating story: {str(e)}")
+
+                if story_data:
+                    full_content = story_data['content']
+                    renderer.finish(full_content)
+                    remember_story(story_data)
 
                     st.success("✅ Story generated and saved!")
 
@@ -319,12 +348,17 @@ with tab1:
                             st.info("Select and copy the text above")
                     with col3:
                         if st.button("⭐ Add to Favorites"):
-                            st.session_state.stories[0]['favorite'] = True
+                            if not story_data.get('favorite'):
+                                get_agent().toggle_favorite(story_data['id'])
                             st.success("Added to favorites!")
 
 with tab2:
     st.markdown("### 📚 Your Story Library")
 
+    scope = "This session"
+    if Config.STREAMLIT_SHOW_ALL_STORIES:
+        scope = st.radio("Show", ["This session", "All stories"], horizontal=True)
+
     # Search and filter
     col1, col2, col3 = st.columns([2, 1, 1])
     with col1:
@@ -335,22 +369,14 @@ with tab2:
         show_favorites = st.checkbox("⭐ Show Favorites Only")
 
     # Filter stories
-    filtered_stories = st.session_state.stories
-
-    if search:
-        filtered_stories = [s for s in filtered_stories if search.lower() in s['prompt'].lower() or search.lower() in s['content'].lower()]
-
-    if filter_genre != "All":
-        filtered_stories = [s for s in filtered_stories if s['genre'] == filter_genre]
-
-    if show_favorites:
-        filtered_stories = [s for s in filtered_stories if s.get('favorite', False)]
+    filtered_stories, has_more = load_library(scope, search.strip(), filter_genre, show_favorites,
+                                              st.session_state.library_limit)
 
     # Display stories
     if not filtered_stories:
         st.info("📝 No stories found. Generate your first story!")
     else:
-        for i, story in enumerate(filtered_stories):
+        for story in filtered_stories:
             with st.expander(f"{'⭐' if story.get('favorite') else '📖'} {story['genre']} - {story['prompt'][:50]}..."):
                 # Tags
                 st.markdown(f"""
@@ -374,17 +400,23 @@ with tab2:
                         story['content'],
                         file_name=f"story_{story['genre'].lower()}.md",
                         mime="text/markdown",
-                        key=f"dl_{i}"
+                        key=f"dl_{story['id']}"
                     )
-                with col2:
-                    if st.button("⭐ Toggle Favorite", key=f"fav_{i}"):
-                        idx = st.session_state.stories.index(story)
-                        st.session_state.stories[idx]['favorite'] = not story.get('favorite', False)
-                        st.rerun()
-                with col3:
-                    if st.button("🗑️ Delete", key=f"del_{i}"):
-                        st.session_state.stories.remove(story)
-                        st.rerun()
+                # Only stories written in this session can be changed here
+                if story['id'] in st.session_state.story_ids:
+                    with col2:
+                        if st.button("⭐ Toggle Favorite", key=f"fav_{story['id']}"):
+                            get_agent().toggle_favorite(story['id'])
+                            st.rerun()
+                    with col3:
+                        if st.button("🗑️ Delete", key=f"del_{story['id']}"):
+                            get_agent().delete_story(story['id'])
+                            st.session_state.story_ids.remove(story['id'])
+                            st.rerun()
+
+    if has_more and st.button("Show more"):
+        st.session_state.library_limit += Config.PAGE_SIZE
+        st.rerun()
 
 # Footer
 st.markdown("""
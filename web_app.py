@@ -1,30 +1,167 @@
 """
 FastAPI web application for StoryWriterAgent
 """
+import asyncio
+import hashlib
 import os
+import time
+import zlib
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse
+from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional
+from typing import AsyncIterator, List, Optional
 import json
 
 from config import Config, EXAMPLE_PROMPTS
 from story_agent import StoryAgent
+from http_client import aclose_clients, pool_stats
+from generations import Generation, GenerationRegistry
+from admission import AdmissionController, AdmissionRejected
+from compression import CompressionMiddleware, matching_etag
+from story_export import MEDIA_TYPES
+from metrics import REGISTRY, counter, gauge, histogram
 
-app = FastAPI(title="StoryWriterAgent", version="1.0.0")
+# Initialize story agent
+story_agent = None
+generations = GenerationRegistry(Config.REPLAY_BUFFER_CHUNKS, Config.GENERATION_RETENTION,
+                                 Config.GENERATION_DISCONNECT_GRACE)
+admission = AdmissionController(
+    max_concurrent=Config.MAX_CONCURRENT_GENERATIONS,
+    max_queue=Config.GENERATION_QUEUE_SIZE,
+    queue_timeout=Config.GENERATION_QUEUE_TIMEOUT,
+    client_rpm=Config.CLIENT_REQUESTS_PER_MINUTE,
+    client_burst=Config.CLIENT_BURST,
+    tokens_per_minute=Config.GENERATE_TOKENS_PER_MINUTE
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the store up front so a worker that cannot share it (the json
+    # backend is locked to one process) fails at startup, not on a request
+    get_agent().open()
+    yield
+    # Persist running stats and close the store on shutdown
+    # Stop running generations first so their partial stories are saved
+    await generations.aclose()
+    if story_agent is not None:
+        story_agent.close()
+    await aclose_clients()
 
-# CORS middleware for Render
+
+app = FastAPI(title="StoryWriterAgent", version="1.0.0", lifespan=lifespan)
+
+# CORS middleware for Render; set CORS_ORIGINS to restrict it
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
+    allow_origins=Config.CORS_ORIGINS,
+    # Browsers refuse credentials with a wildcard origin
+    allow_credentials="*" not in Config.CORS_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Generation-Id", "X-Coalesced", "Retry-After"],
 )
 
+
+HTTP_REQUESTS = counter("storywriter_http_requests_total",
+                        "HTTP requests by method, route and status", ("method", "route", "status"))
+HTTP_DURATION = histogram("storywriter_http_request_duration_seconds",
+                          "HTTP request latency until the response body is sent", ("method", "route"))
+HTTP_IN_FLIGHT = gauge("storywriter_http_requests_in_flight",
+                       "HTTP requests currently being served", ("method",))
+
+
+class MetricsMiddleware:
+    """Count and time every request by its route template.
+
+    A plain ASGI middleware rather than ``@app.middleware``, so streamed
+    responses are timed until their last byte and client disconnects
+    still reach the endpoint.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+        method = scope["method"]
+        HTTP_IN_FLIGHT.inc(method=method)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route in the scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_IN_FLIGHT.dec(method=method)
+            HTTP_REQUESTS.inc(method=method, route=route, status=status)
+            HTTP_DURATION.observe(time.perf_counter() - started, method=method, route=route)
+
+
+app.add_middleware(CompressionMiddleware, minimum_size=Config.COMPRESS_MIN_BYTES)
+app.add_middleware(MetricsMiddleware)
+
+
+def _runtime_samples():
+    """Scrape-time gauges for admission, generations, the HTTP pool and the cache"""
+    queue = admission.stats()
+    yield "storywriter_admission_active", "gauge", "Admitted generations holding a slot", {}, queue["active"]
+    yield "storywriter_admission_queued", "gauge", "Generations waiting for a slot", {}, queue["queued"]
+    yield "storywriter_admission_admitted_total", "counter", "Admitted generations", {}, queue["admitted"]
+    for reason, count in queue["rejected"].items():
+        yield ("storywriter_admission_rejected_total", "counter", "Rejected generations by reason",
+               {"reason": reason}, count)
+    running = generations.stats()
+    yield "storywriter_generations_running", "gauge", "Streamed generations in progress", {}, running["running"]
+    yield ("storywriter_generations_coalesced_total", "counter",
+           "Requests that joined an identical in-flight generation", {}, running["coalesced"])
+    pool = pool_stats()
+    for client in ("sync", "async"):
+        values = pool[client]
+        if values is None:
+            continue
+        labels = {"client": client}
+        yield ("storywriter_upstream_connections", "gauge", "Open upstream connections",
+               labels, values["connections"])
+        yield ("storywriter_upstream_in_flight", "gauge", "Upstream HTTP requests in flight",
+               labels, values["in_flight"])
+        yield ("storywriter_upstream_requests_total", "counter", "Upstream HTTP requests",
+               labels, values["requests"])
+        yield ("storywriter_upstream_errors_total", "counter", "Failed upstream HTTP requests",
+               labels, values["errors"])
+    if story_agent is not None:
+        cache = story_agent.cache.stats()
+        for tier, key in (("memory", "hits"), ("disk", "disk_hits")):
+            yield ("storywriter_response_cache_hits_total", "counter", "Response cache hits by tier",
+                   {"tier": tier}, cache[key])
+        yield "storywriter_response_cache_misses_total", "counter", "Response cache misses", {}, cache["misses"]
+        # get_stats catches up with other workers' writes first
+        yield ("storywriter_stories", "gauge", "Stories in the store", {},
+               story_agent.get_stats()["total_stories"])
+
+
+REGISTRY.add_collector(_runtime_samples)
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    return JSONResponse({"detail": exc.detail}, status_code=exc.status_code,
+                        headers={"Retry-After": str(exc.retry_after)})
+
 # Get base directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -32,9 +169,6 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
 
-# Initialize story agent
-story_agent = None
-
 
 def get_agent():
     global story_agent
@@ -50,6 +184,24 @@ class StoryRequest(BaseModel):
     length: str = "medium"
     language: str = "English"
     stream: bool = False
+    # None follows Config.RESPONSE_CACHE / SAVE_PARTIAL_STORIES / COALESCE_REQUESTS
+    cache: Optional[bool] = None
+    save_partial: Optional[bool] = None
+    coalesce: Optional[bool] = None
+
+
+class BatchStoryItem(BaseModel):
+    prompt: str
+    genre: str = "Fantasy"
+    tone: str = "Serious"
+    length: str = "medium"
+    language: str = "English"
+
+
+class BatchRequest(BaseModel):
+    stories: List[BatchStoryItem]
+    concurrency: Optional[int] = None
+    cache: Optional[bool] = None
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -65,60 +217,262 @@ async def home(request: Request):
     })
 
 
+def _client_ids(request: Request) -> List[str]:
+    """Rate-limit identities: the client IP, plus the API key if one is sent"""
+    ids = [f"ip:{request.client.host if request.client else 'unknown'}"]
+    api_key = request.headers.get("x-api-key")
+    authorization = request.headers.get("authorization", "")
+    if not api_key and authorization.lower().startswith("bearer "):
+        api_key = authorization[7:]
+    if api_key:
+        ids.append("key:" + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16])
+    return ids
+
+
 @app.post("/generate")
-async def generate_story(request: StoryRequest):
+async def generate_story(request: StoryRequest, http_request: Request):
     """Generate a new story"""
     agent = get_agent()
-
-    if request.stream:
-        async def stream_generator():
-            for chunk in agent.generate_story_stream(
-                prompt=request.prompt,
-                genre=request.genre,
-                tone=request.tone,
-                length=request.length,
-                language=request.language
-            ):
-                yield f"data: {json.dumps({'content': chunk})}\n\n"
-            yield "data: [DONE]\n\n"
-
-        return StreamingResponse(
-            stream_generator(),
-            media_type="text/event-stream"
+    ticket = await admission.admit(_client_ids(http_request), agent.request_tokens(
+        request.prompt, request.genre, request.tone, request.length, request.language
+    ))
+
+    coalesce = Config.COALESCE_REQUESTS if request.coalesce is None else request.coalesce
+    if request.stream or coalesce:
+        # Identical concurrent requests join one generation; the first request's
+        # cache and save_partial options apply to all of them
+        key = None
+        if coalesce:
+            key = agent.request_key(request.prompt, request.genre, request.tone,
+                                    request.length, request.language)
+        generation, joined = generations.start(lambda on_complete: agent.agenerate_story_stream(
+            prompt=request.prompt,
+            genre=request.genre,
+            tone=request.tone,
+            length=request.length,
+            language=request.language,
+            cache=request.cache,
+            on_complete=on_complete,
+            save_partial=request.save_partial
+        ), key=key)
+        if joined:
+            # Sharing a running generation costs no extra upstream tokens
+            ticket.cancel()
+        else:
+            generation.task.add_done_callback(lambda _: ticket.release())
+        if request.stream:
+            return _event_stream(generation, after=0, request=http_request, joined=joined)
+        return await _wait_for_story(generation)
+
+    try:
+        story = await agent.agenerate_story(
+            prompt=request.prompt,
+            genre=request.genre,
+            tone=request.tone,
+            length=request.length,
+            language=request.language,
+            cache=request.cache
         )
-
-    story = agent.generate_story(
-        prompt=request.prompt,
-        genre=request.genre,
-        tone=request.tone,
-        length=request.length,
-        language=request.language
-    )
+    finally:
+        ticket.release()
     return JSONResponse(story)
 
 
+async def _wait_for_story(generation: Generation) -> JSONResponse:
+    """Non-streamed response for a (possibly shared) generation"""
+    generations.attach(generation)
+    try:
+        # asyncio.wait does not cancel the shared task if this request goes away
+        await asyncio.wait([generation.task])
+    finally:
+        generations.detach(generation)
+    if generation.cancelled:
+        raise HTTPException(status_code=409, detail="Generation cancelled")
+    if generation.error is not None or generation.story is None:
+        raise HTTPException(status_code=502, detail=generation.error or "Generation failed")
+    return JSONResponse(generation.story)
+
+
+def _sse(data: dict, event_id: Optional[int] = None, event: Optional[str] = None) -> str:
+    frame = ""
+    if event_id is not None:
+        frame += f"id: {event_id}\n"
+    if event:
+        frame += f"event: {event}\n"
+    return frame + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _sse_frames(generation: Generation, after: int,
+                      interval: float = 0, max_chars: int = 0) -> AsyncIterator[str]:
+    """SSE frames for a generation; see ``Generation.events`` for chunk merging"""
+    yield _sse({"generation_id": generation.id}, event="generation")
+    async for event_id, kind, payload in generation.events(after, interval, max_chars):
+        if kind == "chunk":
+            yield _sse({"content": payload}, event_id)
+        elif kind in ("done", "cancelled"):
+            yield _sse({"story": payload, "story_id": (payload or {}).get("id")}, event_id, kind)
+        else:
+            yield _sse({"error": payload}, event_id, "error")
+
+
+async def _gzip_frames(frames: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """Gzip a frame stream, flushing after each frame so nothing waits in the compressor"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for frame in frames:
+        yield compressor.compress(frame.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def _accepts_gzip(request: Request) -> bool:
+    encodings = request.headers.get("accept-encoding", "").lower()
+    return any(part.split(";")[0].strip() == "gzip" for part in encodings.split(","))
+
+
+def _event_stream(generation: Generation, after: int, request: Request,
+                  joined: bool = False) -> StreamingResponse:
+    """SSE response for a generation, starting after event id ``after``.
+
+    Token deltas are merged into one frame per ``STREAM_FRAME_INTERVAL``
+    and gzipped when ``STREAM_GZIP`` is on and the client accepts it.
+
+    If the client goes away the generation keeps running for
+    ``GENERATION_DISCONNECT_GRACE`` seconds so it can reconnect to
+    ``/generate/{id}/stream`` with ``Last-Event-ID``; after that it is
+    cancelled and the upstream OpenAI stream is closed.
+    """
+    gzip = Config.STREAM_GZIP and _accepts_gzip(request)
+
+    async def body():
+        generations.attach(generation)
+        try:
+            frames = _sse_frames(generation, after, Config.STREAM_FRAME_INTERVAL,
+                                 Config.STREAM_FRAME_CHARS)
+            async for data in (_gzip_frames(frames) if gzip else frames):
+                yield data
+        finally:
+            generations.detach(generation)
+
+    headers = {"X-Generation-Id": generation.id, "X-Coalesced": str(joined).lower(),
+               "Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"}
+    if gzip:
+        headers.update({"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+    return StreamingResponse(body(), media_type="text/event-stream", headers=headers)
+
+
+@app.get("/generate/{generation_id}/stream")
+async def resume_generation(generation_id: str, request: Request, last_event_id: Optional[int] = None):
+    """Reattach to a streamed generation, replaying chunks after Last-Event-ID"""
+    generation = generations.get(generation_id)
+    if generation is None:
+        raise HTTPException(status_code=404, detail="Generation not found")
+    header = request.headers.get("last-event-id")
+    if last_event_id is None and header:
+        try:
+            last_event_id = int(header)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+    return _event_stream(generation, after=last_event_id or 0, request=request)
+
+
+@app.delete("/generate/{generation_id}")
+async def cancel_generation(generation_id: str):
+    """Cancel a running generation and close its OpenAI stream"""
+    generation = generations.get(generation_id)
+    if generation is None:
+        raise HTTPException(status_code=404, detail="Generation not found")
+    if not generations.cancel(generation):
+        return JSONResponse({"status": "finished"})
+    await asyncio.wait([generation.task])
+    story = generation.story
+    return JSONResponse({"status": "cancelled", "story_id": story["id"] if story else None})
+
+
+@app.post("/generate/batch")
+async def generate_batch(request: BatchRequest, http_request: Request):
+    """Generate many stories; results stream back as NDJSON in completion order"""
+    if not request.stories:
+        raise HTTPException(status_code=400, detail="No stories requested")
+    if len(request.stories) > Config.MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {Config.MAX_BATCH_SIZE} stories per batch")
+    agent = get_agent()
+    admission.check_clients(_client_ids(http_request))
+
+    async def result_lines():
+        items = [item.model_dump() for item in request.stories]
+        # Every item takes a generation slot and is charged to the same
+        # tokens-per-minute budget as /generate
+        async for result in agent.agenerate_batch(items, concurrency=request.concurrency,
+                                                 token_budget=admission.token_budget,
+                                                 cache=request.cache, slot=admission.slot):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    return [f.strip() for f in fields.split(",") if f.strip()]
+
+
+# Cache-Control per route. Library data may change with any write, so clients
+# revalidate every time (a cheap 304 while the ETag still matches); the option
+# lists only change with a deploy.
+LIBRARY_CACHE = "private, no-cache"
+CONFIG_CACHE = "public, max-age=300"
+
+
+def _conditional(request: Request, etag: str, cache_control: str, build) -> Response:
+    """JSON from ``build()``, or 304 Not Modified if the client already holds ``etag``"""
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    matched = matching_etag(request.headers.get("if-none-match"), etag)
+    if matched:
+        headers["ETag"] = matched
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(build(), headers=headers)
+
+
+def _library_etag(agent: StoryAgent) -> str:
+    # Read before the payload is built, so a write in between can only make
+    # the ETag older than the body, never newer
+    return f'"lib-{agent.version}"'
+
+
+def _page(request: Request, agent: StoryAgent, fetch):
+    try:
+        return _conditional(request, _library_etag(agent), LIBRARY_CACHE, fetch)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/stories")
-async def get_stories():
-    """Get all stories"""
+async def get_stories(request: Request, limit: Optional[int] = None, cursor: Optional[str] = None,
+                      fields: Optional[str] = None):
+    """Get a page of stories, newest first"""
     agent = get_agent()
-    return JSONResponse(agent.get_all_stories())
+    return await run_in_threadpool(
+        _page, request, agent, lambda: agent.get_stories_page(limit, cursor, fields=_parse_fields(fields))
+    )
 
 
 @app.get("/stories/{story_id}")
-async def get_story(story_id: str):
+async def get_story(story_id: str, request: Request):
     """Get a specific story"""
     agent = get_agent()
-    story = agent.get_story(story_id)
+    story = await run_in_threadpool(agent.get_story, story_id)
     if not story:
         raise HTTPException(status_code=404, detail="Story not found")
-    return JSONResponse(story)
+    # Stories never change apart from the favorite flag
+    etag = f'"{story["id"]}.{int(bool(story.get("favorite")))}"'
+    return _conditional(request, etag, LIBRARY_CACHE, lambda: story)
 
 
 @app.delete("/stories/{story_id}")
 async def delete_story(story_id: str):
     """Delete a story"""
     agent = get_agent()
-    if agent.delete_story(story_id):
+    if await run_in_threadpool(agent.delete_story, story_id):
         return JSONResponse({"status": "deleted"})
     raise HTTPException(status_code=404, detail="Story not found")
 
@@ -127,38 +481,84 @@ async def delete_story(story_id: str):
 async def toggle_favorite(story_id: str):
     """Toggle favorite status"""
     agent = get_agent()
-    story = agent.toggle_favorite(story_id)
+    story = await run_in_threadpool(agent.toggle_favorite, story_id)
     if not story:
         raise HTTPException(status_code=404, detail="Story not found")
     return JSONResponse(story)
 
 
 @app.get("/favorites")
-async def get_favorites():
-    """Get favorite stories"""
+async def get_favorites(request: Request, limit: Optional[int] = None,
+                        cursor: Optional[str] = None, fields: Optional[str] = None):
+    """Get a page of favorite stories"""
     agent = get_agent()
-    return JSONResponse(agent.get_favorites())
+    return await run_in_threadpool(_page, request, agent, lambda: agent.get_stories_page(
+        limit, cursor, favorites_only=True, fields=_parse_fields(fields)
+    ))
 
 
 @app.get("/search")
-async def search_stories(q: str):
-    """Search stories"""
+async def search_stories(request: Request, q: str, limit: Optional[int] = None,
+                         cursor: Optional[str] = None, fields: Optional[str] = None):
+    """Search stories, best matches first"""
     agent = get_agent()
-    return JSONResponse(agent.search_stories(q))
+    return await run_in_threadpool(
+        _page, request, agent, lambda: agent.search_stories_page(q, limit, cursor, fields=_parse_fields(fields))
+    )
 
 
 @app.get("/stats")
-async def get_stats():
+async def get_stats(request: Request):
     """Get writing statistics"""
     agent = get_agent()
-    return JSONResponse(agent.get_stats())
+    return await run_in_threadpool(
+        lambda: _conditional(request, _library_etag(agent), LIBRARY_CACHE, agent.get_stats)
+    )
+
+
+@app.get("/runtime")
+async def get_runtime():
+    """Get process counters such as response cache hits and misses"""
+    agent = get_agent()
+    return JSONResponse(dict(agent.get_runtime_stats(), generations=generations.stats(),
+                             admission=admission.stats()))
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics in the text exposition format"""
+    # Collectors may read the store (a cold stats load), so render off the loop
+    body = await run_in_threadpool(REGISTRY.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+@app.get("/export")
+async def export_library(format: str = "zip", favorites: bool = False,
+                         genre: Optional[str] = None, q: Optional[str] = None):
+    """Download the whole library (or the stories matching the filters) as one file.
+
+    The file is produced while it is sent, so memory use does not grow
+    with the size of the library.
+    """
+    agent = get_agent()
+    try:
+        chunks = agent.export_library(format, favorites_only=favorites, genre=genre, query=q)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filename = f"stories_{time.strftime('%Y%m%d_%H%M%S')}.{format}"
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}",
+                 "Cache-Control": "no-store"}
+    )
 
 
 @app.get("/export/{story_id}")
 async def export_story(story_id: str, format: str = "txt"):
     """Export a story"""
     agent = get_agent()
-    content = agent.export_story(story_id, format)
+    content = await run_in_threadpool(agent.export_story, story_id, format)
     if not content:
         raise HTTPException(status_code=404, detail="Story not found")
 
@@ -172,16 +572,22 @@ async def export_story(story_id: str, format: str = "txt"):
     )
 
 
+CONFIG_OPTIONS = {
+    "genres": Config.GENRES,
+    "tones": Config.TONES,
+    "lengths": Config.LENGTHS,
+    "languages": Config.LANGUAGES,
+    "examples": EXAMPLE_PROMPTS
+}
+CONFIG_ETAG = '"cfg-{}"'.format(
+    hashlib.sha256(json.dumps(CONFIG_OPTIONS, sort_keys=True).encode()).hexdigest()[:16]
+)
+
+
 @app.get("/config")
-async def get_config():
+async def get_config(request: Request):
     """Get configuration options"""
-    return JSONResponse({
-        "genres": Config.GENRES,
-        "tones": Config.TONES,
-        "lengths": Config.LENGTHS,
-        "languages": Config.LANGUAGES,
-        "examples": EXAMPLE_PROMPTS
-    })
+    return _conditional(request, CONFIG_ETAG, CONFIG_CACHE, lambda: CONFIG_OPTIONS)
 
 
 def run_server():
@@ -192,6 +598,13 @@ def run_server():
     print(f"{'='*50}")
     print(f"\n  Open: http://{Config.HOST}:{Config.PORT}")
     print(f"\n  Press Ctrl+C to stop the server\n")
+    if Config.WEB_WORKERS > 1:
+        if Config.STORAGE_BACKEND.lower() != "sqlite":
+            print("  Several workers need STORAGE_BACKEND=sqlite; starting one worker.\n")
+        else:
+            # Workers import the app themselves, so pass it by name
+            uvicorn.run("web_app:app", host=Config.HOST, port=Config.PORT, workers=Config.WEB_WORKERS)
+            return
     uvicorn.run(app, host=Config.HOST, port=Config.PORT)
 
 